@@ -0,0 +1,108 @@
+import argparse
+import os
+from functools import partial
+
+from libs.alz import ALZ_LEVELS, alz_compress, alz_decompress
+from libs.info import FILE_BLOCK_SIZE
+from libs.manifest import MANIFEST_FILE_NAME
+from libs.parallel import default_jobs, run_parallel
+
+
+def compressed_sizes(input_dir, levels, file_path):
+    """Compress a file at every level, returning the compressed sizes."""
+
+    with open(os.path.join(input_dir, file_path), "rb") as f:
+        file_data = f.read()
+
+    sizes = []
+    for level in levels:
+        compressed_data = alz_compress(file_data, level)
+        if alz_decompress(compressed_data) != file_data:
+            raise ValueError(f"Round trip failed at level {level}")
+        sizes.append(len(compressed_data))
+    return sizes
+
+
+def block_count(size):
+    return (size + FILE_BLOCK_SIZE - 1) // FILE_BLOCK_SIZE
+
+
+def compare_levels(input_dir, levels, baseline="fast", jobs=None):
+    """
+    Report the total compressed size of `input_dir` at each level, and the
+    difference with the `baseline` level in bytes and in GAME.DAT blocks.
+    """
+
+    if baseline not in levels:
+        levels = [baseline, *levels]
+
+    file_list = []
+    for root, _, files in os.walk(input_dir):
+        for file in files:
+            if file == MANIFEST_FILE_NAME:
+                continue
+            file_path = os.path.relpath(os.path.join(root, file), input_dir)
+            file_list.append(file_path)
+
+    file_list.sort()
+
+    results = run_parallel(
+        partial(compressed_sizes, input_dir, levels),
+        file_list,
+        jobs,
+        desc="Compressing files",
+        sizes=[os.path.getsize(os.path.join(input_dir, path)) for path in file_list],
+    )
+
+    total_sizes = [sum(sizes[i] for sizes in results) for i in range(len(levels))]
+    total_blocks = [
+        sum(block_count(sizes[i]) for sizes in results) for i in range(len(levels))
+    ]
+    base = levels.index(baseline)
+
+    print(f"{len(file_list)} files")
+    print(f"{'level':<10}{'bytes':>14}{'delta':>14}{'%':>9}{'blocks':>10}{'delta':>9}")
+    for i, level in enumerate(levels):
+        delta = total_sizes[i] - total_sizes[base]
+        ratio = delta / total_sizes[base] * 100 if total_sizes[base] else 0.0
+        print(
+            f"{level:<10}{total_sizes[i]:>14}{delta:>+14}{ratio:>+8.2f}%"
+            f"{total_blocks[i]:>10}{total_blocks[i] - total_blocks[base]:>+9}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="TGM4 ALZ Compression Level Report",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--input_dir",
+        type=str,
+        default="resources/decompressed_resources",
+        help="Input directory path (decompressed files)",
+    )
+    parser.add_argument(
+        "--levels",
+        type=str,
+        nargs="+",
+        choices=list(ALZ_LEVELS),
+        default=list(ALZ_LEVELS),
+        help="Compression levels to compare",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        choices=list(ALZ_LEVELS),
+        default="fast",
+        help="Compression level the others are compared with (greedy parsing)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Number of worker processes",
+    )
+    args = parser.parse_args()
+
+    compare_levels(args.input_dir, args.levels, args.baseline, args.jobs)
@@ -1,33 +1,121 @@
 import argparse
 import os
+from functools import partial
 
-from libs.alz import alz_compress
-from tqdm import tqdm
+from libs.alz import ALZ_LEVELS
+from libs.archive import open_worker_archive, worker_archive
+from libs.cache import DiskCache, alz_compress_many_cached
+from libs.hashing import content_hash
+from libs.manifest import MANIFEST_FILE_NAME, load_manifest
+from libs.parallel import batch_by_size, default_jobs, item_errors, run_parallel
 
+# Small files are compressed in batches of up to this many bytes, to avoid the
+# per-file overhead
+MAX_BATCH_SIZE = 0x100000  # 1 MiB
+
+
+def is_unchanged(file_path, file_data, original_hashes, check_archive):
+    name = file_path.replace(os.sep, "/")
+    if name in original_hashes:
+        return original_hashes[name] == content_hash(file_data)
+    if check_archive:
+        return worker_archive().read_if_unchanged(name, file_data) is not None
+    return False
+
+
+def compress_files(
+    input_dir, output_dir, level, cache, original_hashes, check_archive, file_paths
+):
+    changed_paths = []
+    changed_datas = []
+    for file_path in file_paths:
+        with item_errors(file_path):
+            with open(os.path.join(input_dir, file_path), "rb") as f:
+                file_data = f.read()
+
+            if is_unchanged(file_path, file_data, original_hashes, check_archive):
+                # Leave it to pack.py to use the original, and drop stale results
+                output_path = os.path.join(output_dir, file_path)
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                continue
+        changed_paths.append(file_path)
+        changed_datas.append(file_data)
+
+    compressed_datas = alz_compress_many_cached(changed_datas, cache, level)
+    for file_path, compressed_data in zip(changed_paths, compressed_datas):
+        with item_errors(file_path):
+            output_path = os.path.join(output_dir, file_path)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            with open(output_path, "wb") as f:
+                f.write(compressed_data)
+    changed = set(changed_paths)
+    return [file_path in changed for file_path in file_paths]
+
+
+def compress(
+    input_dir,
+    output_dir,
+    jobs=None,
+    level="default",
+    cache_dir=None,
+    cache_size=0,
+    original_dir=None,
+    info_path=None,
+    game_path=None,
+):
+    """
+    Compress every file in `input_dir` that differs from the original.
+
+    Files are compared with the manifest of `original_dir`, or with the
+    original game files if they exist and the manifest has no entry. Unchanged
+    files are skipped. Results are cached in `cache_dir` when given.
+    """
 
-def compress(input_dir, output_dir):
     os.makedirs(output_dir, exist_ok=True)
+    cache = DiskCache(cache_dir, cache_size) if cache_dir is not None else None
+    original_hashes = load_manifest(original_dir) if original_dir is not None else {}
+    check_archive = (
+        info_path is not None
+        and game_path is not None
+        and os.path.exists(info_path)
+        and os.path.exists(game_path)
+    )
 
     file_list = []
     for root, _, files in os.walk(input_dir):
         for file in files:
+            if file == MANIFEST_FILE_NAME:
+                continue
             file_path = os.path.relpath(os.path.join(root, file), input_dir)
             file_list.append(file_path)
 
     file_list.sort()
 
-    with tqdm(total=len(file_list), desc="Compressing files") as pbar:
-        for file_path in file_list:
-            pbar.set_postfix_str(f"Compressing: {file_path:<32}")
-            with open(os.path.join(input_dir, file_path), "rb") as f:
-                file_data = f.read()
-            compressed_data = alz_compress(file_data)
-            output_path = os.path.join(output_dir, file_path)
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, "wb") as f:
-                f.write(compressed_data)
-            pbar.update(1)
+    sizes = {path: os.path.getsize(os.path.join(input_dir, path)) for path in file_list}
+    batches = batch_by_size(file_list, list(sizes.values()), MAX_BATCH_SIZE)
+    results = run_parallel(
+        partial(
+            compress_files,
+            input_dir,
+            output_dir,
+            level,
+            cache,
+            original_hashes,
+            check_archive,
+        ),
+        batches,
+        jobs,
+        desc="Compressing files",
+        sizes=[sum(sizes[path] for path in batch) for batch in batches],
+        initializer=open_worker_archive if check_archive else None,
+        initargs=(info_path, game_path) if check_archive else (),
+    )
+    if cache is not None:
+        cache.evict()
 
+    changed = [is_changed for batch_results in results for is_changed in batch_results]
+    print(f"{len(changed) - sum(changed)} unmodified files skipped")
     print("Compression completed")
 
 
@@ -48,9 +136,64 @@ if __name__ == "__main__":
         default="resources/extracted_resources_edited",
         help="Output directory path",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Number of worker processes",
+    )
+    parser.add_argument(
+        "--level",
+        type=str,
+        choices=list(ALZ_LEVELS),
+        default="default",
+        help="Compression level",
+    )
+    parser.add_argument(
+        "--original_dir",
+        type=str,
+        default="resources/decompressed_resources",
+        help="Directory containing original resources (its manifest is used to skip unmodified files)",
+    )
+    parser.add_argument(
+        "--info_path",
+        type=str,
+        default="resources/original_gamefiles/INFO.DAT",
+        help="Path of original INFO.DAT (used to skip unmodified files missing from the manifest)",
+    )
+    parser.add_argument(
+        "--game_path",
+        type=str,
+        default="resources/original_gamefiles/GAME.DAT",
+        help="Path of original GAME.DAT",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default="resources/cache/alz",
+        help="Directory of the compression cache",
+    )
+    parser.add_argument(
+        "--cache_size",
+        type=int,
+        default=1024,
+        help="Maximum size of the compression cache in MiB",
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Disable the compression cache",
+    )
     args = parser.parse_args()
 
     compress(
         args.input_dir,
         args.output_dir,
+        args.jobs,
+        args.level,
+        None if args.no_cache else args.cache_dir,
+        args.cache_size * 1024 * 1024,
+        args.original_dir,
+        args.info_path,
+        args.game_path,
     )
@@ -1,50 +1,115 @@
 import argparse
 import os
+from functools import partial
 
-from libs.tws import TwsFile
-from PIL import Image
-from tqdm import tqdm
+from libs.cache import DiskCache
+from libs.hashing import pixel_hash
+from libs.manifest import find_baseline_pixel_hash, load_manifest
+from libs.parallel import default_jobs, run_parallel
+from libs.texture_file import open_texture, texture_file_format
+from libs.tws import TEXTURE_QUALITIES, TwsFile
 
 
-def png_to_twx(input_dir, original_extract_dir, file_path, output_dir):
+def png_to_twx(
+    input_dir,
+    original_extract_dir,
+    file_path,
+    output_dir,
+    baseline_dir=None,
+    baseline_hashes=None,
+    quality="release",
+    cache=None,
+):
+    """
+    Convert a PNG (or TGA/NPY) file back to TWX.
+
+    Returns whether the file was converted, and the PSNR of the encoded
+    texture (None if it is not block compressed).
+    """
+
     input_file_path = os.path.join(input_dir, file_path)
     original_file_path = os.path.join(original_extract_dir, file_path[:-4])
-    with open(original_file_path, "rb") as f:
-        data = f.read()
+    output_file_path = os.path.join(output_dir, file_path[:-4])
 
-    tws_file = TwsFile.from_bytes(data)
+    with open_texture(input_file_path) as image:
+        if baseline_dir is not None:
+            name = file_path[:-4].replace(os.sep, "/")
+            baseline_hash = find_baseline_pixel_hash(
+                baseline_dir, baseline_hashes or {}, name, file_path
+            )
+            if baseline_hash == pixel_hash(image):
+                # Unmodified: the original is used, so drop stale results
+                if os.path.exists(output_file_path):
+                    os.remove(output_file_path)
+                return False, None
 
-    with Image.open(input_file_path) as image:
-        tws_file.load_from_image(image)
+        with open(original_file_path, "rb") as f:
+            data = f.read()
+        tws_file = TwsFile.from_bytes(data)
+        tws_file.load_from_image(image, quality, cache)
+        psnr = tws_file.psnr(image)
 
-    output_file_path = os.path.join(output_dir, file_path[:-4])
     os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
     with open(output_file_path, "wb") as f:
         f.write(tws_file.to_bytes(data))
-    return True
+    return True, psnr
 
 
-def process_all_png_files(input_dir, original_extract_dir, output_dir):
+def process_all_png_files(
+    input_dir,
+    original_extract_dir,
+    output_dir,
+    jobs=None,
+    baseline_dir=None,
+    quality="release",
+    cache_dir=None,
+    cache_size=0,
+):
+    """
+    Convert every PNG, TGA and NPY file in `input_dir` back to TWX, and print
+    the PSNR of the block compressed textures.
+
+    Files whose pixels match the same texture in `baseline_dir` are
+    skipped. Encoded mipmap levels are cached in `cache_dir` when given.
+    """
+
     os.makedirs(output_dir, exist_ok=True)
+    cache = DiskCache(cache_dir, cache_size) if cache_dir is not None else None
+    baseline_hashes = load_manifest(baseline_dir) if baseline_dir is not None else {}
 
     file_list = []
     for root, _, files in os.walk(input_dir):
         for file in files:
-            if file.lower().endswith(".png"):
+            if texture_file_format(file) is not None:
                 file_path = os.path.relpath(os.path.join(root, file), input_dir)
                 file_list.append(file_path)
 
     file_list.sort()
 
-    with tqdm(total=len(file_list), desc="Processing PNG files") as pbar:
-        for file_path in file_list:
-            pbar.set_postfix_str(f"Processing: {file_path:<36}")  # 32 + 4 for '.png'
-            success = png_to_twx(input_dir, original_extract_dir, file_path, output_dir)
-            if not success:
-                raise ValueError(
-                    f"Error processing {file_path}: Failed to convert texture"
-                )
-            pbar.update(1)
+    results = run_parallel(
+        partial(
+            png_to_twx,
+            input_dir,
+            original_extract_dir,
+            output_dir=output_dir,
+            baseline_dir=baseline_dir,
+            baseline_hashes=baseline_hashes,
+            quality=quality,
+            cache=cache,
+        ),
+        file_list,
+        jobs,
+        desc="Processing PNG files",
+        sizes=[os.path.getsize(os.path.join(input_dir, path)) for path in file_list],
+    )
+    if cache is not None:
+        cache.evict()
+
+    for file_path, (_, psnr) in zip(file_list, results):
+        if psnr is not None:
+            print(f"{file_path}: PSNR {psnr:.2f} dB")
+    converted_count = sum(converted for converted, _ in results)
+    print(f"{len(results) - converted_count} unmodified files skipped")
 
     print("Processing completed")
 
@@ -58,7 +123,7 @@ if __name__ == "__main__":
         "--input_dir",
         type=str,
         default="resources/extracted_textures",
-        help="Input directory path (PNG files to be converted)",
+        help="Input directory path (PNG, TGA or NPY files to be converted)",
     )
     parser.add_argument(
         "--original_extract_dir",
@@ -72,6 +137,56 @@ if __name__ == "__main__":
         default="resources/decompressed_resources_edited",
         help="Output directory (TWX files will be saved here)",
     )
+    parser.add_argument(
+        "--baseline_dir",
+        type=str,
+        default="resources/extracted_textures_backup",
+        help="Directory containing original PNG files (unmodified PNG files are skipped)",
+    )
+    parser.add_argument(
+        "--no_skip",
+        action="store_true",
+        help="Convert all PNG files, even if they are unmodified",
+    )
+    parser.add_argument(
+        "--quality",
+        type=str,
+        choices=list(TEXTURE_QUALITIES),
+        default="release",
+        help="Texture encoding quality (draft is about 4x and normal 1.5x faster than release)",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default="resources/cache/textures",
+        help="Directory of the encoded texture cache",
+    )
+    parser.add_argument(
+        "--cache_size",
+        type=int,
+        default=1024,
+        help="Maximum size of the encoded texture cache in MiB",
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Disable the encoded texture cache",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Number of worker processes",
+    )
     args = parser.parse_args()
 
-    process_all_png_files(args.input_dir, args.original_extract_dir, args.output_dir)
+    process_all_png_files(
+        args.input_dir,
+        args.original_extract_dir,
+        args.output_dir,
+        args.jobs,
+        None if args.no_skip else args.baseline_dir,
+        args.quality,
+        None if args.no_cache else args.cache_dir,
+        args.cache_size * 1024 * 1024,
+    )
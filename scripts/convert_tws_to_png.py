@@ -1,25 +1,64 @@
 import argparse
 import os
+from functools import partial
 
+from libs.archive import open_worker_archive, worker_archive
+from libs.hashing import pixel_hash
+from libs.info import InfoDat
+from libs.manifest import update_manifest
+from libs.parallel import default_jobs, run_parallel
+from libs.texture_file import (
+    DEFAULT_PNG_COMPRESS_LEVEL,
+    TEXTURE_FILE_FORMATS,
+    save_texture,
+)
 from libs.tws import TwsFile
-from tqdm import tqdm
 
 
-def twx_to_png(input_dir, file_path, output_dir):
+def twx_to_png(input_dir, file_path, output_dir, output_format, png_compress_level):
     input_file_path = os.path.join(input_dir, file_path)
     with open(input_file_path, "rb") as f:
         data = f.read()
 
+    return twx_data_to_png(
+        data, file_path, output_dir, output_format, png_compress_level
+    )
+
+
+def twx_data_to_png(
+    data,
+    file_path,
+    output_dir,
+    output_format="png",
+    png_compress_level=DEFAULT_PNG_COMPRESS_LEVEL,
+):
     tws_file = TwsFile.from_bytes(data)
-    png_data = tws_file.to_png()
-    output_file_path = os.path.join(output_dir, file_path + ".png")
+    image = tws_file.to_image()
+    output_file_path = os.path.join(output_dir, f"{file_path}.{output_format}")
     os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
-    with open(output_file_path, "wb") as f:
-        f.write(png_data)
-    return True
+    save_texture(image, output_file_path, output_format, png_compress_level)
+    return pixel_hash(image)
+
 
+def archive_twx_to_png(name, output_dir, output_format, png_compress_level):
+    data = worker_archive().decompressed(name)
+    return twx_data_to_png(data, name, output_dir, output_format, png_compress_level)
+
+
+def process_all_twx_files(
+    input_dir,
+    output_dir,
+    jobs=None,
+    output_format="png",
+    png_compress_level=DEFAULT_PNG_COMPRESS_LEVEL,
+):
+    """
+    Convert every TWX file in `input_dir` to `output_format`.
+
+    TGA and NPY files are not compressed at all, and `png_compress_level`
+    trades the size of PNG files for speed (0 stores them uncompressed).
+    """
 
-def process_all_twx_files(input_dir, output_dir):
     os.makedirs(output_dir, exist_ok=True)
 
     file_list = []
@@ -31,15 +70,59 @@ def process_all_twx_files(input_dir, output_dir):
 
     file_list.sort()
 
-    with tqdm(total=len(file_list), desc="Processing TWX files") as pbar:
-        for file_path in file_list:
-            pbar.set_postfix_str(f"Processing: {file_path:<32}")
-            success = twx_to_png(input_dir, file_path, output_dir)
-            if not success:
-                raise ValueError(
-                    f"Error processing {file_path}: Failed to convert texture"
-                )
-            pbar.update(1)
+    hashes = run_parallel(
+        partial(
+            twx_to_png,
+            input_dir,
+            output_dir=output_dir,
+            output_format=output_format,
+            png_compress_level=png_compress_level,
+        ),
+        file_list,
+        jobs,
+        desc="Processing TWX files",
+        sizes=[os.path.getsize(os.path.join(input_dir, path)) for path in file_list],
+    )
+    names = [file_path.replace(os.sep, "/") for file_path in file_list]
+    update_manifest(output_dir, dict(zip(names, hashes)))
+
+    print("Processing completed")
+
+
+def process_archive_twx_files(
+    info_path,
+    game_path,
+    output_dir,
+    jobs=None,
+    output_format="png",
+    png_compress_level=DEFAULT_PNG_COMPRESS_LEVEL,
+):
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(info_path, "rb") as f:
+        info_data = f.read()
+    info_dat = InfoDat.from_encrypted_bytes(info_data)
+    indices = [
+        i for i, name in enumerate(info_dat.names) if name.lower().endswith(".twx")
+    ]
+    indices.sort(key=lambda i: info_dat.names[i])
+
+    names = [info_dat.names[i] for i in indices]
+    hashes = run_parallel(
+        partial(
+            archive_twx_to_png,
+            output_dir=output_dir,
+            output_format=output_format,
+            png_compress_level=png_compress_level,
+        ),
+        names,
+        jobs,
+        desc="Processing TWX files",
+        sizes=info_dat.table["size"][indices].tolist(),
+        initializer=open_worker_archive,
+        initargs=(info_path, game_path),
+    )
+    update_manifest(output_dir, dict(zip(names, hashes)))
 
     print("Processing completed")
 
@@ -61,6 +144,60 @@ if __name__ == "__main__":
         default="resources/extracted_textures",
         help="Output directory (PNG files will be saved here)",
     )
+    parser.add_argument(
+        "--output_format",
+        type=str,
+        choices=TEXTURE_FILE_FORMATS,
+        default="png",
+        help="Texture file format (tga and npy are uncompressed, for automated round trips)",
+    )
+    parser.add_argument(
+        "--png_compress_level",
+        type=int,
+        choices=range(10),
+        default=DEFAULT_PNG_COMPRESS_LEVEL,
+        metavar="{0..9}",
+        help="zlib compression level of PNG files (0 is the fastest)",
+    )
+    parser.add_argument(
+        "--from_archive",
+        action="store_true",
+        help="Read TWX files straight from the original game files instead of input_dir",
+    )
+    parser.add_argument(
+        "--info_path",
+        type=str,
+        default="resources/original_gamefiles/INFO.DAT",
+        help="Path of original INFO.DAT (used with --from_archive)",
+    )
+    parser.add_argument(
+        "--game_path",
+        type=str,
+        default="resources/original_gamefiles/GAME.DAT",
+        help="Path of original GAME.DAT (used with --from_archive)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Number of worker processes",
+    )
     args = parser.parse_args()
 
-    process_all_twx_files(args.input_dir, args.output_dir)
+    if args.from_archive:
+        process_archive_twx_files(
+            args.info_path,
+            args.game_path,
+            args.output_dir,
+            args.jobs,
+            args.output_format,
+            args.png_compress_level,
+        )
+    else:
+        process_all_twx_files(
+            args.input_dir,
+            args.output_dir,
+            args.jobs,
+            args.output_format,
+            args.png_compress_level,
+        )
@@ -1,32 +1,65 @@
 import argparse
 import os
+from functools import partial
 
-from libs.alz import alz_decompress
-from tqdm import tqdm
+from libs.alz_batch import alz_decompress_many
+from libs.hashing import content_hash
+from libs.manifest import MANIFEST_FILE_NAME, update_manifest
+from libs.parallel import batch_by_size, default_jobs, item_errors, run_parallel
 
+# Small files are decompressed in batches of up to this many bytes, to avoid
+# the per-file overhead
+MAX_BATCH_SIZE = 0x100000  # 1 MiB
 
-def decompress(input_dir, output_dir):
+
+def decompress_files(input_dir, output_dir, file_paths):
+    file_datas = []
+    for file_path in file_paths:
+        with (
+            item_errors(file_path),
+            open(os.path.join(input_dir, file_path), "rb") as f,
+        ):
+            file_datas.append(f.read())
+
+    hashes = []
+    for file_path, decompressed_data in zip(
+        file_paths, alz_decompress_many(file_datas)
+    ):
+        with item_errors(file_path):
+            output_path = os.path.join(output_dir, file_path)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            with open(output_path, "wb") as f:
+                f.write(decompressed_data)
+        hashes.append(content_hash(decompressed_data))
+    return hashes
+
+
+def decompress(input_dir, output_dir, jobs=None):
     os.makedirs(output_dir, exist_ok=True)
 
     file_list = []
     for root, _, files in os.walk(input_dir):
         for file in files:
+            if file == MANIFEST_FILE_NAME:
+                continue
             file_path = os.path.relpath(os.path.join(root, file), input_dir)
             file_list.append(file_path)
 
     file_list.sort()
 
-    with tqdm(total=len(file_list), desc="Extracting files") as pbar:
-        for file_path in file_list:
-            pbar.set_postfix_str(f"Extracting: {file_path:<32}")
-            with open(os.path.join(input_dir, file_path), "rb") as f:
-                file_data = f.read()
-            decompressed_data = alz_decompress(file_data)
-            output_path = os.path.join(output_dir, file_path)
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, "wb") as f:
-                f.write(decompressed_data)
-            pbar.update(1)
+    sizes = {path: os.path.getsize(os.path.join(input_dir, path)) for path in file_list}
+    batches = batch_by_size(file_list, list(sizes.values()), MAX_BATCH_SIZE)
+    results = run_parallel(
+        partial(decompress_files, input_dir, output_dir),
+        batches,
+        jobs,
+        desc="Extracting files",
+        sizes=[sum(sizes[path] for path in batch) for batch in batches],
+    )
+    names = [file_path.replace(os.sep, "/") for file_path in file_list]
+    hashes = [file_hash for batch_hashes in results for file_hash in batch_hashes]
+    update_manifest(output_dir, dict(zip(names, hashes)))
+
     print("Decompression completed")
 
 
@@ -47,9 +80,16 @@ if __name__ == "__main__":
         default="resources/decompressed_resources",
         help="Output directory path",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Number of worker processes",
+    )
     args = parser.parse_args()
 
     decompress(
         args.input_dir,
         args.output_dir,
+        args.jobs,
     )
@@ -1,11 +1,34 @@
 import numpy as np
-from numba import njit
+from numba import njit, types
 
+# Bump whenever the compressor output changes, to invalidate cached results
+ALZ_COMPRESSOR_VERSION = 3
 
-@njit
-def alz_decompress_numba(data: np.ndarray) -> np.ndarray:
-    _WINDOW = 0x1000
-    _START = 0xFEE
+# A back-reference token (2 bytes plus 1/8 of a flag byte) expands to at most
+# 18 bytes, so the data never expands by more than 9 times
+ALZ_MAX_EXPANSION = 9
+
+# Kernel argument types. Input buffers are always passed read-only (see
+# `_input_array`), so each kernel needs a single signature. Only the
+# decompression kernels, which nearly every tool calls, are given signatures so
+# that they are compiled (or loaded from the cache) on import. The compressor
+# and the other kernels are compiled on first use.
+BYTES_RO = types.Array(types.uint8, 1, "C", readonly=True)
+BYTES = types.Array(types.uint8, 1, "C")
+INT64S = types.Array(types.int64, 1, "C")
+
+
+def _input_array(data: bytes) -> np.ndarray:
+    """View `data` as a read-only array, whether or not the buffer is writable."""
+
+    data_array = np.frombuffer(data, dtype=np.uint8)
+    data_array.flags.writeable = False
+    return data_array
+
+
+@njit(cache=True)
+def _alz_header_length(data: np.ndarray) -> int:
+    """Get the length of the ALZ header, or 0 if `data` is not compressed."""
 
     # Check header - ALZ + version number (0x31)
     if (
@@ -15,21 +38,102 @@ def alz_decompress_numba(data: np.ndarray) -> np.ndarray:
         or data[2] != 90
         or (data[3] & 0x7F) != 0x31
     ):
+        return 0
+    # The extended header also holds the decompressed size
+    if data[3] & 0x80:
+        return 8
+    return 4
+
+
+@njit(
+    types.int64(BYTES_RO),
+    cache=True,
+)
+def alz_scan_decompressed_size_numba(data: np.ndarray) -> int:
+    """Compute the decompressed size by walking the flags and tokens."""
+
+    hdr_len = _alz_header_length(data)
+    if hdr_len == 0:
+        return len(data)
+
+    src_pos = hdr_len
+    src_len = len(data)
+    size = 0
+    flags = 0
+
+    while src_pos < src_len:
+        flags >>= 1
+        if (flags & 0x100) == 0:
+            flags = data[src_pos] | 0xFF00
+            src_pos += 1
+
+        if src_pos >= src_len:
+            break
+
+        if flags & 1:  # literal
+            src_pos += 1
+            size += 1
+        else:  # back-reference
+            if src_pos + 1 >= src_len:
+                break
+            size += (data[src_pos + 1] & 0x0F) + 3
+            src_pos += 2
+
+    return size
+
+
+@njit(
+    types.int64(BYTES_RO),
+    cache=True,
+)
+def alz_decompressed_size_numba(data: np.ndarray) -> int:
+    """
+    Get the decompressed size from the extended header, or compute it.
+
+    A header size above the largest possible expansion of the data (9 output
+    bytes per input byte) is not trusted, and the size is computed instead.
+    """
+
+    hdr_len = _alz_header_length(data)
+    if hdr_len == 8:
+        size = (
+            data[4]
+            | (np.int64(data[5]) << 8)
+            | (np.int64(data[6]) << 16)
+            | (np.int64(data[7]) << 24)
+        )
+        if size <= ALZ_MAX_EXPANSION * (len(data) - hdr_len):
+            return size
+    return alz_scan_decompressed_size_numba(data)
+
+
+@njit(cache=True)
+def _alz_decompress_into(data: np.ndarray, out: np.ndarray, partial: bool) -> int:
+    """
+    Decompress `data` into `out`, returning the decompressed size.
+
+    If `out` is too small, returns -1, or stops once it is full if `partial`
+    is set.
+    """
+
+    _WINDOW = 0x1000
+    _START = 0xFEE
+
+    hdr_len = _alz_header_length(data)
+    if hdr_len == 0:
         # not alz: raw copy
-        return data
+        if len(data) > len(out):
+            if not partial:
+                return -1
+            out[:] = data[: len(out)]
+            return len(out)
+        out[: len(data)] = data
+        return len(data)
 
-    hdr_len = 8 if (data[3] & 0x80) else 4
     src = data[hdr_len:]
     src_pos = 0
     src_len = len(src)
-
-    # sliding window buffer
-    window = np.zeros(_WINDOW, dtype=np.uint8)
-    win_pos = _START
-
-    # Pre-allocate output buffer
-    estimated_output_size = max(src_len * 3, 1024)
-    out = np.zeros(estimated_output_size, dtype=np.uint8)
+    out_len = len(out)
     out_pos = 0
 
     flags = 0
@@ -37,8 +141,6 @@ def alz_decompress_numba(data: np.ndarray) -> np.ndarray:
     while src_pos < src_len:
         flags >>= 1
         if (flags & 0x100) == 0:
-            if src_pos >= src_len:
-                break
             flags = src[src_pos] | 0xFF00
             src_pos += 1
 
@@ -46,19 +148,11 @@ def alz_decompress_numba(data: np.ndarray) -> np.ndarray:
             break
 
         if flags & 1:  # literal
-            byte = src[src_pos]
+            if out_pos >= out_len:
+                return out_pos if partial else -1
+            out[out_pos] = src[src_pos]
             src_pos += 1
-
-            # Expand output buffer if needed
-            if out_pos >= len(out):
-                new_out = np.zeros(len(out) * 2, dtype=np.uint8)
-                new_out[:out_pos] = out[:out_pos]
-                out = new_out
-
-            out[out_pos] = byte
             out_pos += 1
-            window[win_pos] = byte
-            win_pos = (win_pos + 1) & 0xFFF
         else:  # back-reference
             if src_pos + 1 >= src_len:
                 break
@@ -69,133 +163,339 @@ def alz_decompress_numba(data: np.ndarray) -> np.ndarray:
 
             offset = ((b2 & 0xF0) << 4) | b1
             length = (b2 & 0x0F) + 3
+            if out_pos + length > out_len:
+                if not partial:
+                    return -1
+                length = out_len - out_pos
+
+            # The window is the last 4 KB of the output, so the offset is
+            # resolved to a position in the output. Positions before the start
+            # are the zero-filled initial window.
+            dist = (out_pos + _START - offset) & 0xFFF
+            if dist == 0:
+                dist = _WINDOW
+            ref_pos = out_pos - dist
+
+            if ref_pos >= 0 and dist >= length:
+                out[out_pos : out_pos + length] = out[ref_pos : ref_pos + length]
+                out_pos += length
+            else:
+                # Overlapping (run-length) or partly in the initial window
+                for i in range(length):
+                    if ref_pos + i >= 0:
+                        out[out_pos] = out[ref_pos + i]
+                    else:
+                        out[out_pos] = 0
+                    out_pos += 1
+            if out_pos == out_len and partial:
+                break
 
-            # Expand output buffer if needed
-            if out_pos + length >= len(out):
-                new_size = max(len(out) * 2, out_pos + length + 1024)
-                new_out = np.zeros(new_size, dtype=np.uint8)
-                new_out[:out_pos] = out[:out_pos]
-                out = new_out
+    return out_pos
 
-            for i in range(length):
-                byte = window[(offset + i) & 0xFFF]
-                out[out_pos] = byte
-                out_pos += 1
-                window[win_pos] = byte
-                win_pos = (win_pos + 1) & 0xFFF
 
-    # Return only the used portion of the output buffer
-    # Numba-compatible: avoid using .tobytes()
+@njit(
+    types.int64(BYTES_RO, BYTES),
+    cache=True,
+)
+def alz_decompress_into_numba(data: np.ndarray, out: np.ndarray) -> int:
+    """
+    Decompress `data` into `out`, returning the decompressed size.
+
+    Returns -1 if `out` is too small.
+    """
+
+    return _alz_decompress_into(data, out, False)
+
+
+@njit(cache=True)
+def alz_decompress_head_numba(data: np.ndarray, out: np.ndarray) -> int:
+    """
+    Decompress the first `len(out)` bytes of `data` into `out`, returning the
+    number of bytes written. The rest of the data is not decoded.
+    """
+
+    return _alz_decompress_into(data, out, True)
+
+
+@njit(cache=True)
+def alz_decompress_numba(data: np.ndarray) -> np.ndarray:
+    size = alz_scan_decompressed_size_numba(data)
+    out = np.empty(size, dtype=np.uint8)
+    out_pos = alz_decompress_into_numba(data, out)
     return out[:out_pos]
 
 
-def alz_decompress(data: bytes) -> bytes:
-    data_array = np.frombuffer(data, dtype=np.uint8)
-    result_array = alz_decompress_numba(data_array)
+def alz_decompressed_size(data: bytes) -> int:
+    return alz_decompressed_size_numba(_input_array(data))
 
-    return bytes(result_array)
 
+def alz_decompress(data: bytes) -> bytearray:
+    """
+    Decompress ALZ data (or return a copy of uncompressed data).
 
-@njit
-def alz_compress_numba(data: np.ndarray) -> np.ndarray:
-    _WINDOW = 0x1000
-    _START = 0xFEE
+    The output buffer is allocated once with the exact decompressed size.
+    """
 
-    n = len(data)
-    if n == 0:
-        # There is no data to compress
-        result = np.zeros(4, dtype=np.uint8)
-        result[0] = 65  # 'A'
-        result[1] = 76  # 'L'
-        result[2] = 90  # 'Z'
-        result[3] = 0x31
-        return result
+    data_array = _input_array(data)
+    size = alz_decompressed_size_numba(data_array)
+    result = bytearray(size)
+    out_pos = alz_decompress_into_numba(
+        data_array, np.frombuffer(result, dtype=np.uint8)
+    )
 
-    # Initialize hash table (2-byte hash)
-    HASH_SIZE = 1 << 16
-    last_pos = np.full(HASH_SIZE, -1, dtype=np.int32)
+    if out_pos < 0:
+        # The size in the extended header is wrong, so count it instead
+        size = alz_scan_decompressed_size_numba(data_array)
+        result = bytearray(size)
+        out_pos = alz_decompress_into_numba(
+            data_array, np.frombuffer(result, dtype=np.uint8)
+        )
+    if out_pos < size:
+        # The data ends before the size given by the header
+        del result[out_pos:]
+    return result
 
-    # 2-byte hash function
-    def h(p):
-        if p + 1 < n:
-            return ((data[p] << 8) ^ data[p + 1]) & 0xFFFF
-        return 0
 
-    # Initialize sliding window
-    window = np.zeros(_WINDOW, dtype=np.uint8)
-    win_pos = _START
+# Hash chains: head holds the latest position of each 2-byte prefix, and
+# chain links every position in the window to the previous one. Positions are
+# stored offset by a base, so the tables can be reused for the next buffer by
+# raising the base past the old positions instead of clearing them.
+HASH_SIZE = 1 << 16
 
-    # Prepare output buffer
-    max_output_size = n + (n // 7) + 100
-    output = np.zeros(max_output_size, dtype=np.uint8)
-    output[0] = 65  # 'A'
-    output[1] = 76  # 'L'
-    output[2] = 90  # 'Z'
-    output[3] = 0x31
-    output_pos = 4
-
-    # Token management variables
-    token_flags = 0
-    token_start_pos = output_pos
-    output_pos += 1  # Reserve flag byte
-    token_count = 0
-
-    # Token bundle processing function
-    def flush_tokens():
-        nonlocal token_start_pos, output_pos, token_count, token_flags
-        if token_count > 0:
+
+@njit(cache=True)
+def new_hash_tables():
+    head = np.full(HASH_SIZE, -1, dtype=np.int64)
+    chain = np.full(0x1000, -1, dtype=np.int64)
+    return head, chain
+
+
+@njit(cache=True)
+def _insert_position(data, pos, head, chain, base):
+    key = (data[pos] << 8) | data[pos + 1]
+    chain[pos & 0xFFF] = head[key]
+    head[key] = base + pos
+
+
+@njit(cache=True)
+def _find_match(data, pos, head, chain, base, max_chain, known_len=0, known_dist=0):
+    """
+    Find the longest match for `data[pos:]` among the previous positions with
+    the same 2-byte prefix, trying at most `max_chain` candidates.
+
+    A match already known to be `known_len` bytes long at `known_dist` is
+    only replaced by a longer one, which skips comparing shorter candidates.
+
+    Returns (length, distance), or (0, 0) if there is no match of 3+ bytes.
+    """
+
+    max_len = min(18, len(data) - pos)
+    if max_len < 3:
+        return 0, 0
+
+    best_len = known_len
+    best_dist = known_dist
+    candidate = head[(data[pos] << 8) | data[pos + 1]] - base
+    tries = 0
+    while candidate >= 0 and tries < max_chain:
+        dist = pos - candidate
+        if dist > 0xFFF:
+            break
+
+        # Only a candidate that also matches the byte after the current best
+        # can improve on it
+        if data[candidate + best_len] == data[pos + best_len]:
+            match_len = 0
+            while (
+                match_len < max_len
+                and data[candidate + match_len] == data[pos + match_len]
+            ):
+                match_len += 1
+            if match_len > best_len:
+                best_len = match_len
+                best_dist = dist
+                if match_len == max_len:
+                    break
+
+        candidate = chain[candidate & 0xFFF] - base
+        tries += 1
+
+    if best_len < 3:
+        return 0, 0
+    return best_len, best_dist
+
+
+@njit(cache=True)
+def _optimal_parse(data, head, chain, base, max_chain):
+    """
+    Choose the tokens giving the smallest output with dynamic programming.
+
+    Every token costs a flag bit plus 8 bits (literal) or 16 bits
+    (back-reference), and any length up to the longest match at a position is
+    available at the same distance. Returns the token length (1 for literals)
+    and the match distance for every position.
+
+    Matches are searched at every position, so the hash chains are only
+    followed for `max_chain` candidates.
+    """
+
+    n = len(data)
+    match_len = np.zeros(n, dtype=np.int32)
+    match_dist = np.zeros(n, dtype=np.int32)
+    for i in range(n):
+        # The match at the previous position continues here with the same
+        # distance, so only longer matches are searched for
+        known_len = 0
+        known_dist = 0
+        if i > 0 and match_len[i - 1] > 3:
+            known_len = match_len[i - 1] - 1
+            known_dist = match_dist[i - 1]
+        if known_len == min(18, n - i):
+            match_len[i] = known_len
+            match_dist[i] = known_dist
+        else:
+            match_len[i], match_dist[i] = _find_match(
+                data,
+                i,
+                head,
+                chain,
+                base,
+                max_chain,
+                known_len,
+                known_dist,
+            )
+        if i + 1 < n:
+            _insert_position(data, i, head, chain, base)
+
+    # cost[i]: minimum number of bits to encode data[i:]
+    cost = np.zeros(n + 1, dtype=np.int64)
+    token_len = np.ones(n, dtype=np.int32)
+    for i in range(n - 1, -1, -1):
+        cost[i] = cost[i + 1] + 9
+        for length in range(3, match_len[i] + 1):
+            match_cost = cost[i + length] + 17
+            if match_cost <= cost[i]:
+                cost[i] = match_cost
+                token_len[i] = length
+
+    return token_len, match_dist
+
+
+@njit(cache=True)
+def alz_compress_bound(size: int) -> int:
+    """Get the largest possible output size of `alz_compress_into_numba`."""
+
+    # Header, and a flag byte for every 8 literals
+    return 4 + size + (size + 7) // 8
+
+
+# Encoder state carried between calls of `_encode_tokens`. Output positions
+# are indices of the output buffer.
+_POS = 0  # next position of the data to encode
+_INSERTED = 1  # positions before this are in the hash chains
+_NEXT_POS = 2  # position of the match found by the lazy matching lookahead
+_NEXT_LEN = 3
+_NEXT_DIST = 4
+_OUTPUT_POS = 5
+_FLAG_POS = 6  # flag byte of the current token bundle
+_TOKEN_COUNT = 7
+_TOKEN_FLAGS = 8
+
+
+@njit(cache=True)
+def _new_encoder_state(output_pos):
+    state = np.zeros(9, dtype=np.int64)
+    state[_NEXT_POS] = -1
+    # Reserve the flag byte of the first token bundle
+    state[_FLAG_POS] = output_pos
+    state[_OUTPUT_POS] = output_pos + 1
+    return state
+
+
+@njit(cache=True)
+def _encode_tokens(
+    data,
+    end,
+    output,
+    state,
+    head,
+    chain,
+    base,
+    origin,
+    max_chain,
+    lazy,
+    token_len,
+    token_dist,
+):
+    """
+    Encode the tokens starting before `end`, continuing from `state`.
+
+    Matches may extend past `end` up to the end of `data`. `origin` is the
+    position of `data[0]` in the whole stream, which sets the window offsets.
+    Tokens are taken from `token_len` and `token_dist` when they are given
+    (optimal parsing) instead of searching the hash chains.
+    """
+
+    _START = 0xFEE
+
+    n = len(data)
+    optimal = len(token_len) > 0
+
+    i = state[_POS]
+    inserted = state[_INSERTED]
+    next_pos = state[_NEXT_POS]
+    next_len = state[_NEXT_LEN]
+    next_dist = state[_NEXT_DIST]
+    output_pos = state[_OUTPUT_POS]
+    token_start_pos = state[_FLAG_POS]
+    token_count = state[_TOKEN_COUNT]
+    token_flags = state[_TOKEN_FLAGS]
+
+    while i < end:
+        if token_count == 8:
+            # Token bundle is complete, reserve the flag byte of the next one
             output[token_start_pos] = token_flags
             token_flags = 0
             token_start_pos = output_pos
             output_pos += 1
             token_count = 0
 
-    # Compression starts
-    i = 0
-    while i < n:
-        if token_count == 8:
-            flush_tokens()
-
-        # Optimal match search
-        best_len = 0
-        best_dist = 0
-
-        if i + 2 < n:
-            key = h(i)
-            prev = last_pos[key]
-            last_pos[key] = i
-
-            # Match search
-            if prev >= 0 and (i - prev) <= 0xFFF and data[i] == data[prev]:
-                dist = i - prev
-                match_len = 1
-                max_match = min(18, n - i)
-
-                # Match length calculation
-                while (
-                    match_len < max_match
-                    and data[i + match_len] == data[prev + match_len]
-                ):
-                    match_len += 1
-
-                # At least 3 bytes match
-                if match_len >= 3:
-                    best_len = match_len
-                    best_dist = dist
+        if optimal:
+            best_len = token_len[i]
+            best_dist = token_dist[i]
+        else:
+            # Every position before i must be in the hash chains
+            while inserted < i:
+                if inserted + 1 < n:
+                    _insert_position(data, inserted, head, chain, base)
+                inserted += 1
+
+            if next_pos == i:
+                best_len = next_len
+                best_dist = next_dist
+            else:
+                best_len, best_dist = _find_match(data, i, head, chain, base, max_chain)
+
+        # Lazy matching: emit a literal instead if the next position has a
+        # longer match
+        if lazy and not optimal and best_len >= 3 and best_len < 18 and i + 1 < n:
+            _insert_position(data, i, head, chain, base)
+            inserted = i + 1
+            next_pos = i + 1
+            next_len, next_dist = _find_match(
+                data, next_pos, head, chain, base, max_chain
+            )
+            if next_len > best_len:
+                best_len = 0
 
         # Back-reference or literal encoding
         if best_len >= 3:
-            # Back-reference token
-            off = (win_pos - best_dist) & 0xFFF
+            # Back-reference token, addressed by its position in the window
+            off = (_START + origin + i - best_dist) & 0xFFF
             output[output_pos] = off & 0xFF
             output[output_pos + 1] = ((off >> 4) & 0xF0) | (best_len - 3)
             output_pos += 2
 
-            # Update window
-            for k in range(best_len):
-                window[win_pos] = data[i + k]
-                win_pos = (win_pos + 1) & 0xFFF
-
             i += best_len
         else:
             # Literal token
@@ -203,31 +503,330 @@ def alz_compress_numba(data: np.ndarray) -> np.ndarray:
             output[output_pos] = data[i]
             output_pos += 1
 
-            # Update window
-            window[win_pos] = data[i]
-            win_pos = (win_pos + 1) & 0xFFF
-
             i += 1
 
         token_count += 1
 
-    # Process last token bundle
-    flush_tokens()
+    state[_POS] = i
+    state[_INSERTED] = inserted
+    state[_NEXT_POS] = next_pos
+    state[_NEXT_LEN] = next_len
+    state[_NEXT_DIST] = next_dist
+    state[_OUTPUT_POS] = output_pos
+    state[_FLAG_POS] = token_start_pos
+    state[_TOKEN_COUNT] = token_count
+    state[_TOKEN_FLAGS] = token_flags
+
+
+@njit(cache=True)
+def alz_compress_into_numba(
+    data: np.ndarray,
+    output: np.ndarray,
+    head: np.ndarray,
+    chain: np.ndarray,
+    base: int,
+    max_chain: int,
+    lazy: bool,
+    optimal: bool,
+) -> int:
+    """
+    Compress `data` into `output`, returning the compressed size.
+
+    `output` must hold at least `alz_compress_bound(len(data))` bytes. The hash
+    tables must not contain positions at or above `base`.
+    """
 
-    # Check compressed size
-    compressed_size = output_pos
+    output[0] = 65  # 'A'
+    output[1] = 76  # 'L'
+    output[2] = 90  # 'Z'
+    output[3] = 0x31
 
-    # Important: If no compression gain, return original data without ALZ header
-    if compressed_size >= n:
-        return data
+    n = len(data)
+    if n == 0:
+        # There is no data to compress
+        return 4
+
+    # Tokens chosen in advance by the optimal parser
+    if optimal:
+        token_len, token_dist = _optimal_parse(data, head, chain, base, max_chain)
+    else:
+        token_len = np.zeros(0, dtype=np.int32)
+        token_dist = np.zeros(0, dtype=np.int32)
+
+    state = _new_encoder_state(4)
+    _encode_tokens(
+        data,
+        n,
+        output,
+        state,
+        head,
+        chain,
+        base,
+        0,
+        max_chain,
+        lazy,
+        token_len,
+        token_dist,
+    )
+
+    # Process last token bundle (no flag byte is needed after it)
+    output[state[_FLAG_POS]] = state[_TOKEN_FLAGS]
+    output_pos = state[_OUTPUT_POS]
+
+    # Important: If no compression gain, store original data without ALZ header
+    if output_pos >= n:
+        output[:n] = data
+        return n
+
+    return output_pos
+
+
+@njit(cache=True)
+def alz_compress_numba(
+    data: np.ndarray, max_chain: int = 4, lazy: bool = False, optimal: bool = False
+) -> np.ndarray:
+    n = len(data)
+    head, chain = new_hash_tables()
+    output = np.empty(alz_compress_bound(n), dtype=np.uint8)
+    output_pos = alz_compress_into_numba(
+        data, output, head, chain, 0, max_chain, lazy, optimal
+    )
+    return output[:output_pos]
+
+
+# Compression levels as (max_chain, lazy, optimal)
+ALZ_LEVELS = {
+    "fast": (4, False, False),
+    "default": (32, True, False),
+    "max": (4096, True, False),
+    "optimal": (512, False, True),
+}
+
+
+def alz_level_params(level: str) -> tuple[int, bool, bool]:
+    if level not in ALZ_LEVELS:
+        raise ValueError(f"Unsupported compression level: {level}")
+    return ALZ_LEVELS[level]
 
-    # Return compressed result
-    result = np.zeros(compressed_size, dtype=np.uint8)
-    result[:compressed_size] = output[:compressed_size]
-    return result
 
+def alz_compress(data: bytes, level: str = "default") -> bytes:
+    max_chain, lazy, optimal = alz_level_params(level)
 
-def alz_compress(data: bytes) -> bytes:
-    data_array = np.frombuffer(data, dtype=np.uint8).copy()
-    result_array = alz_compress_numba(data_array)
+    data_array = _input_array(data)
+    result_array = alz_compress_numba(data_array, max_chain, lazy, optimal)
     return bytes(result_array)
+
+
+@njit(
+    types.UniTuple(types.int64, 2)(BYTES_RO, BYTES, INT64S, BYTES),
+    cache=True,
+)
+def alz_decompress_stream_numba(
+    src: np.ndarray, window: np.ndarray, state: np.ndarray, out: np.ndarray
+) -> tuple[int, int]:
+    """
+    Decompress the complete tokens of `src` (without the header) into `out`.
+
+    `window` and `state` (window position, flags) carry the decoder state
+    between calls. Returns the number of bytes consumed and produced; a token
+    that is cut off at the end of `src` is left unconsumed.
+    """
+
+    win_pos = state[0]
+    flags = state[1]
+
+    src_pos = 0
+    src_len = len(src)
+    out_pos = 0
+    out_len = len(out)
+
+    while out_pos + 18 <= out_len:
+        # Only commit to a token once all of its bytes are available
+        next_flags = flags >> 1
+        pos = src_pos
+        if (next_flags & 0x100) == 0:
+            if pos >= src_len:
+                break
+            next_flags = src[pos] | 0xFF00
+            pos += 1
+
+        if next_flags & 1:  # literal
+            if pos >= src_len:
+                break
+            byte = src[pos]
+            out[out_pos] = byte
+            out_pos += 1
+            window[win_pos] = byte
+            win_pos = (win_pos + 1) & 0xFFF
+            pos += 1
+        else:  # back-reference
+            if pos + 1 >= src_len:
+                break
+            b1 = src[pos]
+            b2 = src[pos + 1]
+            pos += 2
+
+            offset = ((b2 & 0xF0) << 4) | b1
+            length = (b2 & 0x0F) + 3
+            for i in range(length):
+                byte = window[(offset + i) & 0xFFF]
+                out[out_pos] = byte
+                out_pos += 1
+                window[win_pos] = byte
+                win_pos = (win_pos + 1) & 0xFFF
+
+        flags = next_flags
+        src_pos = pos
+
+    state[0] = win_pos
+    state[1] = flags
+    return src_pos, out_pos
+
+
+class AlzDecompressor:
+    """
+    Incremental ALZ decompressor.
+
+    Feed the compressed data in chunks to `decompress`, which returns the
+    data decompressed so far, then call `flush` at the end. Only the 4 KB
+    window and a partial token are kept between calls. Data without an ALZ
+    header is passed through unchanged.
+    """
+
+    def __init__(self):
+        self._window = np.zeros(0x1000, dtype=np.uint8)
+        self._state = np.array([0xFEE, 0], dtype=np.int64)
+        self._pending = b""
+        self._compressed = None  # unknown until the header is read
+
+    def decompress(self, data: bytes) -> bytearray:
+        data = self._pending + bytes(data)
+        self._pending = b""
+
+        if self._compressed is None:
+            if len(data) < 4:
+                self._pending = data
+                return bytearray()
+            self._compressed = _alz_header_length(np.frombuffer(data[:4], np.uint8)) > 0
+            if self._compressed:
+                hdr_len = 8 if data[3] & 0x80 else 4
+                if len(data) < hdr_len:
+                    self._compressed = None
+                    self._pending = data
+                    return bytearray()
+                data = data[hdr_len:]
+
+        if not self._compressed:
+            return bytearray(data)
+
+        # A back-reference expands 2 bytes to at most 18
+        result = bytearray(len(data) * 9 + 18)
+        consumed, produced = alz_decompress_stream_numba(
+            _input_array(data),
+            self._window,
+            self._state,
+            np.frombuffer(result, dtype=np.uint8),
+        )
+        self._pending = data[consumed:]
+        del result[produced:]
+        return result
+
+    def flush(self) -> bytearray:
+        """Finish the stream, returning data too short to hold an ALZ header."""
+
+        # A cut off token at the end of the stream is dropped
+        result = bytearray(self._pending if self._compressed is None else b"")
+        self._pending = b""
+        return result
+
+
+class AlzCompressor:
+    """
+    Incremental ALZ compressor.
+
+    Feed the data in chunks to `compress`, which returns the compressed data
+    ready so far, then call `flush` at the end. Only the 4 KB window, a short
+    lookahead and the current token bundle are kept between calls. Unlike
+    `alz_compress`, the output always has an ALZ header, even if it is larger
+    than the input.
+    """
+
+    # Input held back so that matches are not cut short at the end of a chunk
+    LOOKAHEAD = 18
+
+    def __init__(self, level: str = "default"):
+        max_chain, lazy, optimal = alz_level_params(level)
+        if optimal:
+            raise ValueError(f"Unsupported compression level for streaming: {level}")
+        self._max_chain = max_chain
+        self._lazy = lazy
+
+        self._head, self._chain = new_hash_tables()
+        self._state = _new_encoder_state(0)
+        # Window and pending input, starting at stream position _base
+        self._buffer = np.zeros(0, dtype=np.uint8)
+        self._base = 0
+        # Encoded bytes of the current token bundle, starting with its flag byte
+        self._bundle = bytes(1)
+        self._header = b"ALZ\x31"
+
+    def compress(self, data: bytes) -> bytes:
+        self._buffer = np.concatenate(
+            (self._buffer, np.frombuffer(data, dtype=np.uint8))
+        )
+        return self._encode(len(self._buffer) - self.LOOKAHEAD)
+
+    def flush(self) -> bytes:
+        result = self._encode(len(self._buffer))
+        # The header is still pending if there was no data
+        result = self._header + result
+        self._header = b""
+        if self._state[_TOKEN_COUNT] > 0:
+            # Process last token bundle (no flag byte is needed after it)
+            bundle = bytearray(self._bundle)
+            bundle[0] = self._state[_TOKEN_FLAGS]
+            result += bundle
+        self._bundle = b""
+        return result
+
+    def _encode(self, end: int) -> bytes:
+        start = self._state[_POS]
+        if end <= start:
+            return b""
+
+        output = np.empty(len(self._bundle) + alz_compress_bound(end - start), np.uint8)
+        output[: len(self._bundle)] = np.frombuffer(self._bundle, dtype=np.uint8)
+        _encode_tokens(
+            self._buffer,
+            end,
+            output,
+            self._state,
+            self._head,
+            self._chain,
+            self._base,
+            self._base,
+            self._max_chain,
+            self._lazy,
+            np.zeros(0, dtype=np.int32),
+            np.zeros(0, dtype=np.int32),
+        )
+
+        # Bytes before the current token bundle are final
+        flag_pos = self._state[_FLAG_POS]
+        result = self._header + output[:flag_pos].tobytes()
+        self._header = b""
+        self._bundle = output[flag_pos : self._state[_OUTPUT_POS]].tobytes()
+        self._state[_OUTPUT_POS] -= flag_pos
+        self._state[_FLAG_POS] = 0
+
+        # Drop the input that has left the window. The hash chains are indexed
+        # by position modulo the window size, so whole windows are dropped.
+        shift = max(0, min(self._state[_POS], self._state[_INSERTED]) - 0x1000)
+        shift &= ~0xFFF
+        if shift > 0:
+            self._buffer = self._buffer[shift:].copy()
+            self._base += shift
+            for index in (_POS, _INSERTED, _NEXT_POS):
+                self._state[index] -= shift
+
+        return result
@@ -0,0 +1,190 @@
+from collections.abc import Sequence
+
+import numpy as np
+from libs.alz import (
+    alz_compress_bound,
+    alz_compress_into_numba,
+    alz_decompress,
+    alz_decompress_head_numba,
+    alz_decompress_into_numba,
+    alz_decompressed_size_numba,
+    alz_level_params,
+    new_hash_tables,
+)
+from libs.parallel import worker_threads
+from numba import config, get_num_threads, njit, prange, set_num_threads
+
+# The batch kernels start Numba's thread pool, so they are kept out of
+# `libs.alz` and are compiled on first use.
+
+
+def _limit_threads():
+    # In a worker of run_parallel, the kernels share the CPUs with the others
+    set_num_threads(min(worker_threads(), config.NUMBA_NUM_THREADS))
+
+
+@njit(parallel=True, cache=True)
+def alz_compress_many_numba(
+    data: np.ndarray,
+    offsets: np.ndarray,
+    output: np.ndarray,
+    output_offsets: np.ndarray,
+    max_chain: int,
+    lazy: bool,
+    optimal: bool,
+    batches: int,
+) -> np.ndarray:
+    """
+    Compress the buffers `data[offsets[k]:offsets[k + 1]]` into
+    `output[output_offsets[k]:output_offsets[k + 1]]` in parallel, returning
+    the compressed sizes.
+
+    The buffers are split into `batches` runs, each sharing a set of hash
+    tables.
+    """
+
+    count = len(offsets) - 1
+    sizes = np.zeros(count, dtype=np.int64)
+
+    batches = min(count, batches)
+    for batch in prange(batches):
+        head, chain = new_hash_tables()
+        base = 0
+        for k in range(batch * count // batches, (batch + 1) * count // batches):
+            sizes[k] = alz_compress_into_numba(
+                data[offsets[k] : offsets[k + 1]],
+                output[output_offsets[k] : output_offsets[k + 1]],
+                head,
+                chain,
+                base,
+                max_chain,
+                lazy,
+                optimal,
+            )
+            base += offsets[k + 1] - offsets[k]
+
+    return sizes
+
+
+def _concatenate(buffers: Sequence[bytes]) -> tuple[np.ndarray, np.ndarray]:
+    """Join the buffers into one array, with the start of each and the end."""
+
+    offsets = np.zeros(len(buffers) + 1, dtype=np.int64)
+    np.cumsum([len(buffer) for buffer in buffers], out=offsets[1:])
+    data = np.frombuffer(b"".join(buffers), dtype=np.uint8)
+    return data, offsets
+
+
+def alz_compress_many(
+    buffers: Sequence[bytes], level: str = "default"
+) -> list[memoryview]:
+    """
+    Compress many buffers in a single parallel call.
+
+    This avoids the per-call overhead of `alz_compress` for small buffers. The
+    results are views of a single shared buffer.
+    """
+
+    max_chain, lazy, optimal = alz_level_params(level)
+    if not buffers:
+        return []
+    _limit_threads()
+
+    data, offsets = _concatenate(buffers)
+    output_offsets = np.zeros(len(buffers) + 1, dtype=np.int64)
+    np.cumsum(alz_compress_bound(np.diff(offsets)), out=output_offsets[1:])
+    output = bytearray(int(output_offsets[-1]))
+    sizes = alz_compress_many_numba(
+        data,
+        offsets,
+        np.frombuffer(output, dtype=np.uint8),
+        output_offsets,
+        max_chain,
+        lazy,
+        optimal,
+        get_num_threads() * 4,
+    )
+
+    view = memoryview(output)
+    return [
+        view[start : start + size]
+        for start, size in zip(output_offsets[:-1].tolist(), sizes.tolist())
+    ]
+
+
+@njit(parallel=True, cache=True)
+def alz_decompressed_sizes_numba(data: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    count = len(offsets) - 1
+    sizes = np.zeros(count, dtype=np.int64)
+    for k in prange(count):
+        sizes[k] = alz_decompressed_size_numba(data[offsets[k] : offsets[k + 1]])
+    return sizes
+
+
+@njit(parallel=True, cache=True)
+def alz_decompress_many_numba(
+    data: np.ndarray, offsets: np.ndarray, out: np.ndarray, out_offsets: np.ndarray
+) -> np.ndarray:
+    """
+    Decompress the buffers `data[offsets[k]:offsets[k + 1]]` into
+    `out[out_offsets[k]:out_offsets[k + 1]]` in parallel, returning the
+    decompressed sizes (-1 where the output is too small).
+    """
+
+    count = len(offsets) - 1
+    sizes = np.zeros(count, dtype=np.int64)
+    for k in prange(count):
+        sizes[k] = alz_decompress_into_numba(
+            data[offsets[k] : offsets[k + 1]], out[out_offsets[k] : out_offsets[k + 1]]
+        )
+    return sizes
+
+
+@njit(parallel=True, cache=True)
+def alz_decompress_heads_numba(
+    data: np.ndarray, starts: np.ndarray, ends: np.ndarray, heads: np.ndarray
+) -> np.ndarray:
+    """
+    Decompress the first `heads.shape[1]` bytes of the buffers
+    `data[starts[k]:ends[k]]` into `heads[k]` in parallel, returning their
+    full decompressed sizes. Rows of shorter buffers are left partly unset.
+    """
+
+    count = len(starts)
+    sizes = np.zeros(count, dtype=np.int64)
+    for k in prange(count):
+        buffer = data[starts[k] : ends[k]]
+        sizes[k] = alz_decompressed_size_numba(buffer)
+        alz_decompress_head_numba(buffer, heads[k])
+    return sizes
+
+
+def alz_decompress_many(buffers: Sequence[bytes]) -> list[memoryview]:
+    """
+    Decompress many buffers in a single parallel call.
+
+    This avoids the per-call overhead of `alz_decompress` for small buffers.
+    The results are views of a single shared buffer.
+    """
+
+    if not buffers:
+        return []
+    _limit_threads()
+
+    data, offsets = _concatenate(buffers)
+    out_offsets = np.zeros(len(buffers) + 1, dtype=np.int64)
+    np.cumsum(alz_decompressed_sizes_numba(data, offsets), out=out_offsets[1:])
+    out = bytearray(int(out_offsets[-1]))
+    sizes = alz_decompress_many_numba(
+        data, offsets, np.frombuffer(out, dtype=np.uint8), out_offsets
+    )
+
+    view = memoryview(out)
+    results = []
+    for k, (start, size) in enumerate(zip(out_offsets[:-1].tolist(), sizes.tolist())):
+        if size < 0:
+            # The size in the extended header is wrong
+            results.append(memoryview(alz_decompress(buffers[k])))
+        else:
+            results.append(view[start : start + size])
+    return results
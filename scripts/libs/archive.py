@@ -0,0 +1,142 @@
+import contextlib
+import mmap
+import os
+from collections.abc import Iterator, Sequence
+from typing import Self
+
+import numpy as np
+from libs.alz import AlzDecompressor, alz_decompress
+from libs.alz_batch import alz_decompress_heads_numba
+from libs.info import FILE_BLOCK_SIZE, FileEntry, InfoDat
+
+STREAM_CHUNK_SIZE = 0x10000  # 64 KiB
+
+
+class GameArchive:
+    """
+    Random access to the files of an INFO.DAT/GAME.DAT pair.
+
+    GAME.DAT is memory-mapped, so reading a file returns a view of the mapping
+    without copying. Views must be released before the archive is closed, or
+    the mapping is kept alive until they are garbage collected.
+    """
+
+    def __init__(self, info_path: str, game_path: str):
+        with open(info_path, "rb") as f:
+            info_data = f.read()
+        self.info_dat = InfoDat.from_encrypted_bytes(info_data)
+
+        # Kept open for the lifetime of the archive, and closed by close()
+        self._game_file = open(game_path, "rb")  # noqa: SIM115
+        self._mmap = None
+        if os.fstat(self._game_file.fileno()).st_size > 0:
+            self._mmap = mmap.mmap(self._game_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+        else:
+            self._view = memoryview(b"")
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.info_dat
+
+    def close(self):
+        self._view.release()
+        if self._mmap is not None:
+            # Still referenced by a view, closed once it is collected
+            with contextlib.suppress(BufferError):
+                self._mmap.close()
+            self._mmap = None
+        self._game_file.close()
+
+    def read(self, name: str) -> memoryview:
+        entry = self.info_dat.get(name)
+        if entry is None:
+            raise KeyError(name)
+        return self.read_entry(entry)
+
+    def read_entry(self, entry: FileEntry) -> memoryview:
+        if entry.block_count == 0:
+            return memoryview(b"")
+        start = entry.block_offset * FILE_BLOCK_SIZE
+        end = start + entry.size
+        if end > len(self._view):
+            raise ValueError(f"Error: {entry.name} - Out of range of GAME.DAT")
+        return self._view[start:end]
+
+    def decompressed(self, name: str) -> bytearray:
+        return alz_decompress(self.read(name))
+
+    def decompressed_heads(
+        self, indices: Sequence[int], length: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Decompress only the first `length` bytes of many files in one call.
+
+        `indices` are the indices of the files in the INFO.DAT table. Returns an
+        array of shape (len(indices), length) with the first bytes of each file
+        (zero-padded), and an array of their decompressed sizes.
+        """
+
+        records = self.info_dat.table[np.asarray(indices, dtype=np.intp)]
+        used = records["block_count"] > 0
+        starts = np.where(
+            used, records["block_offset"].astype(np.int64) * FILE_BLOCK_SIZE, 0
+        )
+        ends = np.where(used, starts + records["size"], 0)
+        out_of_range = np.flatnonzero(ends > len(self._view))
+        if len(out_of_range) > 0:
+            name = self.info_dat.names[indices[out_of_range[0]]]
+            raise ValueError(f"Error: {name} - Out of range of GAME.DAT")
+
+        heads = np.zeros((len(indices), length), dtype=np.uint8)
+        sizes = alz_decompress_heads_numba(
+            np.frombuffer(self._view, dtype=np.uint8), starts, ends, heads
+        )
+        return heads, sizes
+
+    def iter_decompressed(
+        self, name: str, chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[bytearray]:
+        """Decompress a file in chunks, keeping only a small buffer in memory."""
+
+        decompressor = AlzDecompressor()
+        with self.read(name) as file_data:
+            for start in range(0, len(file_data), chunk_size):
+                chunk = decompressor.decompress(file_data[start : start + chunk_size])
+                if chunk:
+                    yield chunk
+        chunk = decompressor.flush()
+        if chunk:
+            yield chunk
+
+    def read_if_unchanged(self, name: str, decompressed_data: bytes) -> bytes | None:
+        """Get the original compressed data if it decompresses to `decompressed_data`."""
+
+        entry = self.info_dat.get(name)
+        if entry is None:
+            return None
+        with self.read_entry(entry) as file_data:
+            if alz_decompress(file_data) != decompressed_data:
+                return None
+            return bytes(file_data)
+
+
+_worker_archive: GameArchive | None = None
+
+
+def open_worker_archive(info_path: str, game_path: str):
+    """Worker initializer for `run_parallel` that opens the archive once per process."""
+
+    global _worker_archive
+    _worker_archive = GameArchive(info_path, game_path)
+
+
+def worker_archive() -> GameArchive:
+    if _worker_archive is None:
+        raise RuntimeError("The worker archive is not opened")
+    return _worker_archive
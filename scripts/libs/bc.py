@@ -0,0 +1,132 @@
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def _color_palette(block, palette, allow_transparent):
+    """
+    Fill the 4-entry RGBA palette of a BC1 color block.
+
+    Blocks with c0 <= c1 use 3 colors and transparent black, unless
+    `allow_transparent` is off (BC3 color blocks).
+    """
+
+    c0 = np.int32(block[0]) | (np.int32(block[1]) << 8)
+    c1 = np.int32(block[2]) | (np.int32(block[3]) << 8)
+    for i, color in enumerate((c0, c1)):
+        r = (color >> 11) & 0x1F
+        g = (color >> 5) & 0x3F
+        b = color & 0x1F
+        palette[i, 0] = (r << 3) | (r >> 2)
+        palette[i, 1] = (g << 2) | (g >> 4)
+        palette[i, 2] = (b << 3) | (b >> 2)
+        palette[i, 3] = 255
+
+    for c in range(3):
+        if allow_transparent and c0 <= c1:
+            palette[2, c] = (palette[0, c] + palette[1, c]) // 2
+            palette[3, c] = 0
+        else:
+            palette[2, c] = (2 * palette[0, c] + palette[1, c]) // 3
+            palette[3, c] = (palette[0, c] + 2 * palette[1, c]) // 3
+    palette[2, 3] = 255
+    palette[3, 3] = 0 if allow_transparent and c0 <= c1 else 255
+
+
+@njit(cache=True)
+def _write_color_block(block, palette, out, y, x, write_alpha):
+    indices = (
+        np.uint32(block[4])
+        | (np.uint32(block[5]) << 8)
+        | (np.uint32(block[6]) << 16)
+        | (np.uint32(block[7]) << 24)
+    )
+    channels = 4 if write_alpha else 3
+    for k in range(16):
+        index = (indices >> (2 * k)) & 3
+        for c in range(channels):
+            out[y + k // 4, x + k % 4, c] = palette[index, c]
+
+
+@njit(cache=True)
+def _write_alpha_block(block, out, y, x):
+    a0 = np.int32(block[0])
+    a1 = np.int32(block[1])
+    alphas = np.empty(8, dtype=np.int32)
+    alphas[0] = a0
+    alphas[1] = a1
+    if a0 > a1:
+        for i in range(1, 7):
+            alphas[i + 1] = ((7 - i) * a0 + i * a1) // 7
+    else:
+        for i in range(1, 5):
+            alphas[i + 1] = ((5 - i) * a0 + i * a1) // 5
+        alphas[6] = 0
+        alphas[7] = 255
+
+    indices = np.uint64(0)
+    for i in range(6):
+        indices |= np.uint64(block[2 + i]) << np.uint64(8 * i)
+    for k in range(16):
+        index = (indices >> np.uint64(3 * k)) & np.uint64(7)
+        out[y + k // 4, x + k % 4, 3] = alphas[index]
+
+
+@njit(cache=True)
+def decode_bc1_numba(data, out):
+    """Decode BC1 blocks into `out`, an RGBA array of shape (height, width, 4)."""
+
+    palette = np.empty((4, 4), dtype=np.int32)
+    blocks_x = out.shape[1] // 4
+    for i in range((out.shape[0] // 4) * blocks_x):
+        block = data[i * 8 : i * 8 + 8]
+        _color_palette(block, palette, True)
+        _write_color_block(
+            block, palette, out, (i // blocks_x) * 4, (i % blocks_x) * 4, True
+        )
+
+
+@njit(cache=True)
+def decode_bc3_numba(data, out):
+    """Decode BC3 blocks into `out`, an RGBA array of shape (height, width, 4)."""
+
+    palette = np.empty((4, 4), dtype=np.int32)
+    blocks_x = out.shape[1] // 4
+    for i in range((out.shape[0] // 4) * blocks_x):
+        y = (i // blocks_x) * 4
+        x = (i % blocks_x) * 4
+        _write_alpha_block(data[i * 16 : i * 16 + 8], out, y, x)
+        color_block = data[i * 16 + 8 : i * 16 + 16]
+        _color_palette(color_block, palette, False)
+        _write_color_block(color_block, palette, out, y, x, False)
+
+
+def _decode(decode, block_size, data, width, height, out):
+    if width % 4 != 0 or height % 4 != 0:
+        raise ValueError(f"Texture size must be a multiple of 4: {width}x{height}")
+    expected_size = (width // 4) * (height // 4) * block_size
+    if len(data) < expected_size:
+        raise ValueError(
+            f"Invalid block data size: {len(data)} / {expected_size} for {width}x{height}"
+        )
+
+    if out is None:
+        out = np.empty((height, width, 4), dtype=np.uint8)
+    decode(np.frombuffer(data, dtype=np.uint8, count=expected_size), out)
+    return out
+
+
+def decode_bc1(
+    data: bytes, width: int, height: int, out: np.ndarray | None = None
+) -> np.ndarray:
+    """Decode BC1 blocks into an RGBA array of shape (height, width, 4), or `out`."""
+
+    return _decode(decode_bc1_numba, 8, data, width, height, out)
+
+
+def decode_bc3(
+    data: bytes, width: int, height: int, out: np.ndarray | None = None
+) -> np.ndarray:
+    """Decode BC3 blocks into an RGBA array of shape (height, width, 4), or `out`."""
+
+    return _decode(decode_bc3_numba, 16, data, width, height, out)
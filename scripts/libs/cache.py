@@ -0,0 +1,105 @@
+import contextlib
+import os
+
+from libs.alz import ALZ_COMPRESSOR_VERSION, alz_compress
+from libs.alz_batch import alz_compress_many
+from libs.hashing import content_hash
+
+# Suffix of the files being written by `DiskCache.put`
+_TEMP_SUFFIX = ".tmp"
+
+
+class DiskCache:
+    """
+    Content-addressed blob cache stored in a directory.
+
+    Entries are touched when read, and `evict` removes the least recently used
+    entries until the cache fits in `max_size` bytes. Writes are atomic, so the
+    cache can be shared by several worker processes.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # Evicted by another process since it was read
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(path)
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}{_TEMP_SUFFIX}"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for file in files:
+                if file.endswith(_TEMP_SUFFIX):
+                    continue  # still being written by `put`
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue  # evicted by another process
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total_size -= size
+
+
+def alz_compress_cached(
+    data: bytes, cache: DiskCache | None, level: str = "default"
+) -> bytes:
+    if cache is None:
+        return alz_compress(data, level)
+
+    key = _alz_cache_key(data, level)
+    compressed_data = cache.get(key)
+    if compressed_data is None:
+        compressed_data = alz_compress(data, level)
+        cache.put(key, compressed_data)
+    return compressed_data
+
+
+def alz_compress_many_cached(
+    buffers: list[bytes], cache: DiskCache | None, level: str = "default"
+) -> list[bytes]:
+    """Like `alz_compress_cached`, compressing the cache misses in one batch."""
+
+    if cache is None:
+        return [bytes(data) for data in alz_compress_many(buffers, level)]
+
+    keys = [_alz_cache_key(data, level) for data in buffers]
+    results = [cache.get(key) for key in keys]
+    misses = [k for k, compressed_data in enumerate(results) if compressed_data is None]
+    compressed_misses = alz_compress_many([buffers[k] for k in misses], level)
+    for k, compressed_data in zip(misses, compressed_misses):
+        results[k] = bytes(compressed_data)
+        cache.put(keys[k], results[k])
+    return results
+
+
+def _alz_cache_key(data: bytes, level: str) -> str:
+    return content_hash(f"alz-{ALZ_COMPRESSOR_VERSION}-{level}:".encode(), data)
@@ -0,0 +1,175 @@
+import errno
+import io
+import os
+from typing import BinaryIO, Self
+
+from libs.info import FILE_BLOCK_SIZE
+
+COPY_CHUNK_SIZE = 0x800000  # 8 MiB
+WRITE_BUFFER_SIZE = 0x800000  # 8 MiB, a multiple of FILE_BLOCK_SIZE
+
+# copy_file_range can refuse some file pairs (e.g. across filesystems).
+# In that case we fall back to a plain read/write loop.
+_COPY_FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+}
+
+
+def copy_range(
+    src_file: BinaryIO,
+    dst_file: BinaryIO,
+    src_offset: int,
+    dst_offset: int,
+    length: int,
+):
+    """
+    Copy `length` bytes from `src_file` at `src_offset` to `dst_file` at `dst_offset`.
+
+    Uses `os.copy_file_range` when available so the data never leaves the kernel.
+    """
+
+    # Pending buffered writes must land before writing through the descriptor
+    dst_file.flush()
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            src_fd = src_file.fileno()
+            dst_fd = dst_file.fileno()
+            while length > 0:
+                copied = os.copy_file_range(
+                    src_fd, dst_fd, length, src_offset, dst_offset
+                )
+                if copied == 0:
+                    break
+                src_offset += copied
+                dst_offset += copied
+                length -= copied
+        except io.UnsupportedOperation:
+            pass  # not backed by a real file
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+
+    if length > 0:
+        src_file.seek(src_offset)
+        dst_file.seek(dst_offset)
+        while length > 0:
+            chunk = src_file.read(min(length, COPY_CHUNK_SIZE))
+            if not chunk:
+                break
+            dst_file.write(chunk)
+            length -= len(chunk)
+
+    if length > 0:
+        raise ValueError(
+            f"Source file is truncated: {length} bytes missing at offset {src_offset}"
+        )
+
+
+class GameDatWriter:
+    """
+    Sequential writer of a new GAME.DAT of `block_count` blocks.
+
+    The file is preallocated, and entries must be written in block order.
+    Each entry is zero-padded to the next block boundary, so the file is
+    written strictly front to back without seeking over unwritten gaps. Small
+    entries are gathered in a buffer of `buffer_size` bytes, and written with
+    a single call when it is full.
+    """
+
+    def __init__(
+        self,
+        game_file: BinaryIO,
+        block_count: int,
+        buffer_size: int = WRITE_BUFFER_SIZE,
+    ):
+        self._game_file = game_file
+        self._size = block_count * FILE_BLOCK_SIZE
+        self._buffer = bytearray(buffer_size)
+        self._buffered = 0
+        self._position = 0  # end of the written data, including the buffer
+
+        game_file.seek(0)
+        game_file.truncate()
+        if self._size > 0 and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(game_file.fileno(), 0, self._size)
+            except io.UnsupportedOperation:
+                pass  # not backed by a real file
+            except OSError as e:
+                if e.errno not in _COPY_FALLBACK_ERRNOS:
+                    raise
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    def write(self, block_offset: int, file_data: bytes):
+        """Write an entry at `block_offset`, padded to the next block boundary."""
+
+        self._pad_to(block_offset * FILE_BLOCK_SIZE)
+        if len(file_data) >= len(self._buffer):
+            # Large entries skip the buffer
+            self.flush()
+            self._game_file.write(file_data)
+            self._position += len(file_data)
+        else:
+            self._append(file_data)
+        self._pad_to(self._block_end())
+
+    def copy(self, src_file: BinaryIO, src_offset: int, block_offset: int, length: int):
+        """Copy `length` bytes from `src_file` at `src_offset` to `block_offset`."""
+
+        self._pad_to(block_offset * FILE_BLOCK_SIZE)
+        self.flush()
+        copy_range(src_file, self._game_file, src_offset, self._position, length)
+        self._position += length
+        # copy_file_range doesn't move the file position
+        self._game_file.seek(self._position)
+        self._pad_to(self._block_end())
+
+    def flush(self):
+        if self._buffered:
+            with memoryview(self._buffer) as view:
+                self._game_file.write(view[: self._buffered])
+            self._buffered = 0
+
+    def close(self):
+        """Write the pending data, and check that the file has the expected size."""
+
+        if self._position > self._size:
+            raise ValueError(
+                f"The entries overflow GAME.DAT: {self._position} / {self._size} bytes"
+            )
+        self._pad_to(self._size)
+        self.flush()
+        self._game_file.flush()
+
+    def _block_end(self) -> int:
+        return -(-self._position // FILE_BLOCK_SIZE) * FILE_BLOCK_SIZE
+
+    def _pad_to(self, position: int):
+        if position < self._position:
+            raise ValueError(
+                f"Entries must be written in block order: {position} < {self._position}"
+            )
+        while self._position < position:
+            padding = min(position - self._position, len(self._buffer))
+            if self._buffered + padding > len(self._buffer):
+                self.flush()
+            self._buffer[self._buffered : self._buffered + padding] = bytes(padding)
+            self._buffered += padding
+            self._position += padding
+
+    def _append(self, data: bytes):
+        if self._buffered + len(data) > len(self._buffer):
+            self.flush()
+        self._buffer[self._buffered : self._buffered + len(data)] = data
+        self._buffered += len(data)
+        self._position += len(data)
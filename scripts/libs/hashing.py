@@ -0,0 +1,20 @@
+import hashlib
+
+from PIL import Image
+
+
+def content_hash(*chunks: bytes) -> str:
+    """Fast 128-bit hash of the concatenation of `chunks`, as a hex string."""
+
+    h = hashlib.blake2b(digest_size=16)
+    for chunk in chunks:
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def pixel_hash(image: Image.Image) -> str:
+    """Hash of the decoded RGBA pixels of `image`, independent of the file format."""
+
+    rgba_image = image.convert("RGBA")
+    size = f"{rgba_image.width}x{rgba_image.height}:".encode()
+    return content_hash(size, rgba_image.tobytes())
@@ -1,12 +1,27 @@
+import bisect
+import fnmatch
 import struct
-from dataclasses import dataclass
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from functools import cached_property
 from typing import BinaryIO
 
-from tqdm import tqdm
+import numpy as np
 
 FILE_ENTRY_SIZE = 0x30  # 48 bytes
 FILE_BLOCK_SIZE = 0x800  # 2048 bytes
 
+# Record layout of an entry, matching FileEntry.to_unindexed_bytes
+FILE_ENTRY_DTYPE = np.dtype(
+    [
+        ("name", "S32"),
+        ("size", "<u4"),
+        ("block_offset", "<u4"),
+        ("block_count", "<u4"),
+        ("file_count", "<u4"),
+    ]
+)
+
 
 @dataclass
 class FileEntry:
@@ -72,8 +87,11 @@ class FileEntry:
         game_file.write(file_data)
 
     def update_info(self, file_data: bytes):
-        self.size = len(file_data)
-        self.block_count = (len(file_data) + FILE_BLOCK_SIZE - 1) // FILE_BLOCK_SIZE
+        self.update_size(len(file_data))
+
+    def update_size(self, size: int):
+        self.size = size
+        self.block_count = (size + FILE_BLOCK_SIZE - 1) // FILE_BLOCK_SIZE
         self.block_offset = 0  # Offset is not used in this context
 
 
@@ -81,78 +99,192 @@ class FileEntry:
 class InfoDat:
     header: bytes
     file_count: int
-    entries: list[FileEntry]
+    table: np.ndarray  # FILE_ENTRY_DTYPE records, may be a read-only view
+    _entries: dict[int, FileEntry] = field(default_factory=dict, repr=False)
 
     @classmethod
     def from_plain_bytes(cls, data: bytes) -> "InfoDat":
         header = data[:0x30]
         first_entry = FileEntry.from_indexed_bytes(header)
         file_count = first_entry.file_count
-        entries = []
-
-        for i in tqdm(range(file_count), desc="Processing file entries"):
-            entry = FileEntry.from_unindexed_bytes(data, i)
-            entries.append(entry)
-        return cls(header, file_count, entries)
+        table = np.frombuffer(
+            data, dtype=FILE_ENTRY_DTYPE, count=file_count, offset=0x30
+        )
+        return cls(header, file_count, table)
 
     @classmethod
     def from_encrypted_bytes(cls, data: bytes) -> "InfoDat":
         decrypted_data = cls.decrypt_toc(data)
         return cls.from_plain_bytes(decrypted_data)
 
+    def entry(self, index: int) -> FileEntry:
+        """
+        Get the entry at `index`, creating its `FileEntry` on first access.
+
+        Changes made to the returned entry are written back to the table on
+        serialization.
+        """
+
+        entry = self._entries.get(index)
+        if entry is None:
+            record = self.table[index]
+            entry = FileEntry(
+                record["name"].decode("utf-8"),
+                int(record["size"]),
+                int(record["block_count"]),
+                int(record["block_offset"]),
+                int(record["file_count"]),
+            )
+            self._entries[index] = entry
+        return entry
+
+    @property
+    def entries(self) -> list[FileEntry]:
+        """
+        Get every entry as a `FileEntry`.
+
+        Creating the entries is slow for large tables: loops that only read
+        them should use `names` and the columns of `table` instead.
+        """
+
+        return [self.entry(i) for i in range(self.file_count)]
+
+    @cached_property
+    def names(self) -> list[str]:
+        """The entry names, in table order."""
+
+        return [name.decode("utf-8") for name in self.table["name"].tolist()]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._name_index
+
+    def index_of(self, name: str) -> int | None:
+        return self._name_index.get(name)
+
+    def get(self, name: str) -> FileEntry | None:
+        index = self._name_index.get(name)
+        if index is None:
+            return None
+        return self.entry(index)
+
+    def iter_prefix(self, prefix: str) -> Iterator[FileEntry]:
+        """Iterate over the entries whose name starts with `prefix`, sorted by name."""
+
+        names, indices = self._sorted_names
+        start = bisect.bisect_left(names, prefix)
+        for i in range(start, len(names)):
+            if not names[i].startswith(prefix):
+                break
+            yield self.entry(indices[i])
+
+    def glob(self, pattern: str) -> list[FileEntry]:
+        """
+        Find the entries matching a shell-style pattern, sorted by name.
+
+        As with `fnmatch`, `*` also matches `/`.
+        """
+
+        return [self.entry(index) for index in self.glob_indices(pattern)]
+
+    def glob_indices(self, pattern: str | None = None) -> list[int]:
+        """
+        Like `glob`, but get the indices of the entries in the table.
+
+        Without a pattern, get the indices of all the entries in table order.
+        """
+
+        if pattern is None:
+            return list(range(self.file_count))
+
+        # Only names sharing the literal part of the pattern can match
+        wildcard_positions = [pattern.find(c) for c in "*?[" if c in pattern]
+        prefix = pattern[: min(wildcard_positions, default=len(pattern))]
+
+        names, indices = self._sorted_names
+        result = []
+        for i in range(bisect.bisect_left(names, prefix), len(names)):
+            if not names[i].startswith(prefix):
+                break
+            if fnmatch.fnmatchcase(names[i], pattern):
+                result.append(indices[i])
+        return result
+
+    @cached_property
+    def _name_index(self) -> dict[str, int]:
+        return {name: i for i, name in enumerate(self.names)}
+
+    @cached_property
+    def _sorted_names(self) -> tuple[list[str], list[int]]:
+        items = sorted(self._name_index.items())
+        return [name for name, _ in items], [index for _, index in items]
+
     def to_plain_bytes(self) -> bytes:
-        body = b"".join(entry.to_unindexed_bytes() for entry in self.entries)
-        return self.header + body
+        self._store_entries()
+        return self.header + self.table.tobytes()
 
     def to_encrypted_bytes(self) -> bytes:
-        body = b"".join(entry.to_unindexed_bytes() for entry in self.entries)
-        return self.encrypt_toc(self.header + body)
+        return self.encrypt_toc(self.to_plain_bytes())
 
     def recalculate_offsets(self):
-        last_offset = 0
-        for entry in self.entries:
-            if entry.block_count == 0:
-                continue
-            entry.block_offset = last_offset
-            last_offset += entry.block_count
+        self._store_entries()
+        self._make_table_writable()
+        block_count = self.table["block_count"]
+        # Each entry starts where the previous non-empty entries end
+        offsets = np.cumsum(block_count, dtype=np.uint64) - block_count
+        used = block_count != 0
+        self.table["block_offset"][used] = offsets[used]
+
+        for index, entry in self._entries.items():
+            entry.block_offset = int(self.table["block_offset"][index])
+
+    def end_block(self) -> int:
+        """Get the size of GAME.DAT in blocks: the end of the last non-empty entry."""
+
+        self._store_entries()
+        block_counts = self.table["block_count"]
+        block_ends = self.table["block_offset"].astype(np.uint64) + block_counts
+        return int(block_ends[block_counts > 0].max(initial=0))
+
+    def _store_entries(self):
+        """Write the materialized entries back to the table."""
+
+        if not self._entries:
+            return
+        self._make_table_writable()
+
+        indices = np.fromiter(self._entries.keys(), dtype=np.intp)
+        entries = self._entries.values()
+        self.table["name"][indices] = [entry.name.encode("utf-8") for entry in entries]
+        for name in ("size", "block_offset", "block_count", "file_count"):
+            self.table[name][indices] = [getattr(entry, name) for entry in entries]
+
+    def _make_table_writable(self):
+        # The table starts out as a view of the (immutable) INFO.DAT bytes
+        if not self.table.flags.writeable:
+            self.table = self.table.copy()
 
     @staticmethod
     def decrypt_toc(data: bytes) -> bytes:
         if data[0] == 0 or len(data) <= 16:
             return data
 
-        result = bytearray(data)
+        # Every 16-byte row is decrypted against the 16-byte key at the start,
+        # so the key is tiled over the body (including a ragged final row).
+        key = np.frombuffer(data, dtype=np.uint8, count=16)
+        body = np.frombuffer(data, dtype=np.uint8, offset=16)
+        swapped = (body >> 4) | (body << 4)
+        plain = ~swapped - np.resize(key, len(body))
 
-        for offset in range(16, len(data), 16):
-            for i in range(16):
-                if offset + i >= len(data):
-                    break
-
-                byte_val = result[offset + i]
-                swapped = ((byte_val >> 4) | (byte_val << 4)) & 0xFF
-                not_val = ~swapped & 0xFF
-                result[offset + i] = (not_val - data[i]) & 0xFF
-
-        return bytes(result)
+        return data[:16] + plain.tobytes()
 
     @staticmethod
     def encrypt_toc(data: bytes) -> bytes:
         if data[0] == 0 or len(data) <= 16:
             return data
 
-        header = data[:16]
-        result = bytearray(data)
-
-        for offset in range(16, len(data), 16):
-            for i in range(16):
-                pos = offset + i
-                if pos >= len(data):
-                    break
-
-                plain = result[pos]
-                tmp = (plain + header[i]) & 0xFF
-                x = ~tmp & 0xFF
-                enc = ((x >> 4) | (x << 4)) & 0xFF
-                result[pos] = enc
+        key = np.frombuffer(data, dtype=np.uint8, count=16)
+        body = np.frombuffer(data, dtype=np.uint8, offset=16)
+        x = ~(body + np.resize(key, len(body)))
+        encrypted = (x >> 4) | (x << 4)
 
-        return bytes(result)
+        return data[:16] + encrypted.tobytes()
@@ -0,0 +1,53 @@
+import json
+import os
+
+from libs.hashing import pixel_hash
+from libs.texture_file import TEXTURE_FILE_FORMATS, open_texture
+
+# Stored inside the directory it describes, so it is copied along with it
+MANIFEST_FILE_NAME = ".manifest.json"
+
+
+def load_manifest(directory: str) -> dict[str, str]:
+    """Load the file name -> content hash map of `directory`, if any."""
+
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def update_manifest(directory: str, hashes: dict[str, str]):
+    manifest = load_manifest(directory)
+    manifest.update(hashes)
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, MANIFEST_FILE_NAME + ".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(temp_path, os.path.join(directory, MANIFEST_FILE_NAME))
+
+
+def find_baseline_pixel_hash(
+    baseline_dir: str, manifest: dict[str, str], name: str, file_path: str
+) -> str | None:
+    """
+    Get the pixel hash of texture `name` in `baseline_dir`.
+
+    Falls back to decoding `file_path` in `baseline_dir`, or the same texture
+    in another file format, when the manifest has no entry for it.
+    """
+
+    if name in manifest:
+        return manifest[name]
+    baseline_path = os.path.join(baseline_dir, file_path)
+    if not os.path.exists(baseline_path):
+        candidates = [
+            f"{baseline_path[:-4]}.{file_format}"
+            for file_format in TEXTURE_FILE_FORMATS
+        ]
+        baseline_path = next(filter(os.path.exists, candidates), None)
+        if baseline_path is None:
+            return None
+    with open_texture(baseline_path) as image:
+        return pixel_hash(image)
@@ -0,0 +1,170 @@
+import contextlib
+import multiprocessing
+import os
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+
+from tqdm import tqdm
+
+MAX_CHUNK_SIZE = 16
+
+# Forking a process whose Numba thread pool is running can leave the workers
+# hanging, so they are started from a clean server process (or spawned where
+# that is not available)
+_MP_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+# Number of worker processes of the pool this process belongs to
+_pool_jobs = 1
+
+
+def default_jobs() -> int:
+    return os.cpu_count() or 1
+
+
+def worker_threads() -> int:
+    """
+    Get the number of threads this process can use without oversubscribing the
+    CPUs: all of them, or an equal share in a worker of `run_parallel`.
+    """
+
+    return max(1, default_jobs() // _pool_jobs)
+
+
+def batch_by_size(
+    items: Sequence, sizes: Sequence[int], max_batch_size: int
+) -> list[list]:
+    """
+    Group consecutive items into batches of at most `max_batch_size` in total.
+
+    Items larger than `max_batch_size` get a batch of their own.
+    """
+
+    batches = []
+    batch = []
+    batch_size = 0
+    for item, size in zip(items, sizes):
+        if batch and batch_size + size > max_batch_size:
+            batches.append(batch)
+            batch = []
+            batch_size = 0
+        batch.append(item)
+        batch_size += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class ItemError(RuntimeError):
+    """An error raised while processing a single item of a batch."""
+
+
+@contextlib.contextmanager
+def item_errors(name) -> Iterator[None]:
+    """Name `name` in the errors raised in the block, e.g. for a file of a batch."""
+
+    try:
+        yield
+    except ItemError:
+        raise
+    except Exception as e:
+        raise ItemError(f"Error processing {name}: {e}") from e
+
+
+def _init_worker(jobs: int, initializer: Callable | None, initargs: tuple):
+    global _pool_jobs
+    _pool_jobs = jobs
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _describe(item) -> str:
+    # Batches from batch_by_size are shown by their first item
+    if isinstance(item, list):
+        more = f" (+{len(item) - 1})" if len(item) > 1 else ""
+        return f"{item[0]!s}{more}"
+    return str(item)
+
+
+def _count(item) -> int:
+    # Batches from batch_by_size count as their number of items
+    return len(item) if isinstance(item, list) else 1
+
+
+def _run_chunk(func: Callable, items: list) -> list:
+    results = []
+    for item in items:
+        with item_errors(_describe(item)):
+            results.append(func(item))
+    return results
+
+
+def run_parallel(
+    func: Callable,
+    items: Sequence,
+    jobs: int | None = None,
+    desc: str = "Processing",
+    sizes: Sequence[int] | None = None,
+    initializer: Callable | None = None,
+    initargs: tuple = (),
+) -> list:
+    """
+    Call `func(item)` for every item on a pool of `jobs` worker processes.
+
+    Items are sent to the workers in chunks, largest first when `sizes` is
+    given. The results are returned in the order of `items`. Batches from
+    `batch_by_size` are counted by their number of items in the progress bar.
+    `func` and `initializer` must be picklable (e.g. module-level functions or
+    `functools.partial` of them).
+    """
+
+    if jobs is None:
+        jobs = default_jobs()
+
+    order = list(range(len(items)))
+    if sizes is not None:
+        order.sort(key=lambda i: sizes[i], reverse=True)
+
+    results = [None] * len(items)
+
+    counts = [_count(item) for item in items]
+
+    with tqdm(total=sum(counts), desc=desc) as pbar:
+        if jobs <= 1 or len(items) <= 1:
+            if initializer is not None:
+                initializer(*initargs)
+            for i in order:
+                pbar.set_postfix_str(f"{_describe(items[i]):<32}")
+                results[i] = _run_chunk(func, [items[i]])[0]
+                pbar.update(counts[i])
+            return results
+
+        chunk_size = max(1, min(MAX_CHUNK_SIZE, len(items) // (jobs * 4)))
+        chunks = [order[i : i + chunk_size] for i in range(0, len(order), chunk_size)]
+
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context(_MP_START_METHOD),
+            initializer=_init_worker,
+            initargs=(jobs, initializer, initargs),
+        ) as executor:
+            pending = {
+                executor.submit(_run_chunk, func, [items[i] for i in chunk]): chunk
+                for chunk in chunks
+            }
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_EXCEPTION)
+                    for future in done:
+                        chunk = pending.pop(future)
+                        for i, result in zip(chunk, future.result()):
+                            results[i] = result
+                        pbar.set_postfix_str(f"{_describe(items[chunk[-1]]):<32}")
+                        pbar.update(sum(counts[i] for i in chunk))
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+
+    return results
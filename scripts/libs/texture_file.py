@@ -0,0 +1,50 @@
+import numpy as np
+from PIL import Image
+
+# Lossless formats the textures can be extracted to. TGA and NPY (raw RGBA
+# array) are uncompressed, for round trips that are never edited by hand.
+TEXTURE_FILE_FORMATS = ("png", "tga", "npy")
+
+# PIL's default zlib level for PNG files
+DEFAULT_PNG_COMPRESS_LEVEL = 6
+
+
+def texture_file_format(file_path: str) -> str | None:
+    """Get the texture file format of `file_path` from its extension, if supported."""
+
+    extension = file_path[-4:].lower()
+    for file_format in TEXTURE_FILE_FORMATS:
+        if extension == "." + file_format:
+            return file_format
+    return None
+
+
+def save_texture(
+    image: Image.Image,
+    file_path: str,
+    file_format: str = "png",
+    png_compress_level: int = DEFAULT_PNG_COMPRESS_LEVEL,
+):
+    """Save `image` losslessly to `file_path` in one of `TEXTURE_FILE_FORMATS`."""
+
+    if file_format == "png":
+        image.save(file_path, format="PNG", compress_level=png_compress_level)
+    elif file_format == "tga":
+        image.save(file_path, format="TGA")
+    elif file_format == "npy":
+        np.save(file_path, np.asarray(image.convert("RGBA")))
+    else:
+        raise ValueError(f"Unsupported texture file format: {file_format}")
+
+
+def open_texture(file_path: str) -> Image.Image:
+    """Open a texture file saved by `save_texture`."""
+
+    if texture_file_format(file_path) == "npy":
+        pixels = np.load(file_path)
+        if pixels.dtype != np.uint8 or pixels.ndim != 3 or pixels.shape[2] != 4:
+            raise ValueError(
+                f"Invalid texture array: {pixels.dtype} {pixels.shape} in {file_path}"
+            )
+        return Image.fromarray(pixels)
+    return Image.open(file_path)
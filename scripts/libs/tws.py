@@ -1,11 +1,19 @@
+import bisect
 import io
 import struct
+from collections.abc import Callable
 from dataclasses import dataclass
+from functools import lru_cache, partial
 
+import numpy as np
+from libs.bc import decode_bc1, decode_bc3
+from libs.cache import DiskCache
+from libs.hashing import content_hash
+from libs.texture_file import DEFAULT_PNG_COMPRESS_LEVEL
 from PIL import Image
 from quicktex import RawTexture
-from quicktex.s3tc.bc1 import BC1Decoder, BC1Encoder, BC1Texture
-from quicktex.s3tc.bc3 import BC3Decoder, BC3Encoder, BC3Texture
+from quicktex.s3tc.bc1 import BC1Encoder
+from quicktex.s3tc.bc3 import BC3Encoder
 
 FORMAT_BGR = 7
 FORMAT_RGBA = 8
@@ -16,6 +24,160 @@ FORMAT_BC3 = 13
 TWS_HEADER_SIZE = 0x30
 TWS_MAGIC = 0x30585754  # 'TWX0' in little-endian
 
+# quicktex encoder levels (0-18) of the texture quality presets. Encoding a
+# 512x512 BC1 or BC3 level takes about 0.17s, 0.45s and 0.7s respectively
+# (levels 1-8 are hardly slower than draft)
+TEXTURE_QUALITIES = {
+    "draft": 0,
+    "normal": 9,
+    "release": 10,
+}
+
+# Bump whenever the encoded blocks change, to invalidate cached results
+TEXTURE_ENCODER_VERSION = 1
+
+
+def _halve(pixels: np.ndarray) -> np.ndarray:
+    """Downsample RGBA pixels to the next mipmap level with a 2x2 box filter."""
+
+    height, width = pixels.shape[:2]
+    new_height = max(1, height // 2)
+    new_width = max(1, width // 2)
+
+    # A dimension of 1 is averaged with itself
+    rows = (
+        (pixels[0 : new_height * 2 : 2], pixels[1 : new_height * 2 : 2])
+        if height > 1
+        else (pixels, pixels)
+    )
+    quad = [
+        part.astype(np.uint32)
+        for row in rows
+        for part in (
+            (row[:, 0 : new_width * 2 : 2], row[:, 1 : new_width * 2 : 2])
+            if width > 1
+            else (row, row)
+        )
+    ]
+
+    # Colors are weighted by alpha, so transparent pixels don't bleed in
+    alpha = quad[0][..., 3] + quad[1][..., 3] + quad[2][..., 3] + quad[3][..., 3]
+    weighted = sum(part[..., :3] * part[..., 3:] for part in quad)
+    plain = sum(part[..., :3] for part in quad)
+    alpha_sum = alpha[..., np.newaxis]
+    color = np.where(
+        alpha_sum > 0,
+        (weighted + alpha_sum // 2) // np.maximum(alpha_sum, 1),
+        (plain + 2) // 4,
+    )
+
+    result = np.empty((new_height, new_width, 4), dtype=np.uint8)
+    result[..., :3] = color
+    result[..., 3] = (alpha + 2) // 4
+    return result
+
+
+def mipmap_pyramid(pixels: np.ndarray, levels: int) -> list[np.ndarray]:
+    """Build `levels` mipmap levels from RGBA pixels of shape (height, width, 4)."""
+
+    pyramid = [np.ascontiguousarray(pixels)]
+    while len(pyramid) < levels:
+        pyramid.append(_halve(pyramid[-1]))
+    return pyramid
+
+
+# Bytes per 4x4 block of the block compressed formats
+BLOCK_SIZES = {
+    FORMAT_BC1: 8,
+    FORMAT_BC3_LIKE: 16,
+    FORMAT_BC3: 16,
+}
+
+# Bytes per pixel of the uncompressed formats
+PIXEL_SIZES = {
+    FORMAT_BGR: 3,
+    FORMAT_RGBA: 4,
+}
+
+# Only BC3 textures have mipmaps
+MIPMAP_FORMATS = (FORMAT_BC3_LIKE, FORMAT_BC3)
+
+
+@dataclass(frozen=True)
+class MipLayout:
+    """
+    Dimensions, byte offsets and sizes of every possible mipmap level of a
+    texture, down to 1x1 for the formats with mipmaps.
+
+    Levels smaller than a block take no space. Get it with `mip_layout`,
+    which shares one instance per size and format.
+    """
+
+    width: int
+    height: int
+    data_format: int
+    block_size: int  # 0 for uncompressed formats
+    level_sizes: tuple[tuple[int, int], ...]
+    offsets: tuple[int, ...]  # level k spans offsets[k]:offsets[k + 1]
+
+    @property
+    def level_count(self) -> int:
+        return len(self.level_sizes)
+
+    def level_range(self, level: int) -> tuple[int, int]:
+        """Get the byte offset and size of a mipmap level."""
+
+        return self.offsets[level], self.offsets[level + 1] - self.offsets[level]
+
+    def data_size(self, level_count: int) -> int:
+        """Get the size of the image data holding the first `level_count` levels."""
+
+        return self.offsets[level_count]
+
+    def max_mipmap_level(self, image_data_size: int) -> int:
+        """Get the max mipmap level of image data of `image_data_size` bytes."""
+
+        # The first level count that fits, as levels below a block take no space
+        level_count = bisect.bisect_left(self.offsets, image_data_size, 1)
+        expected_size = self.offsets[min(level_count, self.level_count)]
+        if image_data_size != expected_size:
+            raise ValueError(
+                f"Invalid image data size for format {self.data_format}: {image_data_size} / {expected_size}"
+            )
+        return level_count - 1
+
+
+@lru_cache(maxsize=1024)
+def mip_layout(width: int, height: int, data_format: int) -> MipLayout:
+    """Get the (shared) mipmap layout of a texture."""
+
+    if data_format in BLOCK_SIZES:
+        block_size = BLOCK_SIZES[data_format]
+    elif data_format in PIXEL_SIZES:
+        block_size = 0
+    else:
+        raise ValueError(f"Unsupported format: {data_format}")
+
+    level_count = 1
+    if data_format in MIPMAP_FORMATS:
+        level_count = max(width, height, 1).bit_length()
+    level_sizes = tuple(
+        (max(1, width >> level), max(1, height >> level))
+        for level in range(level_count)
+    )
+
+    offsets = [0]
+    for level_width, level_height in level_sizes:
+        if block_size:
+            size = (level_width // 4) * (level_height // 4) * block_size
+        else:
+            size = level_width * level_height * PIXEL_SIZES[data_format]
+        offsets.append(offsets[-1] + size)
+
+    return MipLayout(
+        width, height, data_format, block_size, level_sizes, tuple(offsets)
+    )
+
 
 @dataclass
 class TwsFile:
@@ -27,60 +189,105 @@ class TwsFile:
 
     @classmethod
     def from_bytes(cls, file_data: bytes) -> "TwsFile":
-        if len(file_data) < TWS_HEADER_SIZE:
+        width, height, data_format, max_mipmap_level = cls.peek_header(
+            file_data, len(file_data)
+        )
+        image_data = file_data[TWS_HEADER_SIZE:]
+
+        return cls(image_data, width, height, data_format, max_mipmap_level)
+
+    @classmethod
+    def peek_header(cls, header: bytes, file_size: int) -> tuple[int, int, int, int]:
+        """
+        Read the width, height, data format and max mipmap level of a TWX file
+        of `file_size` bytes from its first `TWS_HEADER_SIZE` bytes only.
+        """
+
+        if len(header) < TWS_HEADER_SIZE or file_size < TWS_HEADER_SIZE:
             raise ValueError("The file is too small to be a TWX file")
 
         # Check magic number
-        magic = struct.unpack("<I", file_data[0:4])[0]
+        magic = struct.unpack("<I", header[0:4])[0]
         if magic != TWS_MAGIC:
-            raise ValueError(f"Invalid TWX file magic number: {file_data[0:4].hex()}")
+            raise ValueError(f"Invalid TWX file magic number: {header[0:4].hex()}")
 
         # Extract header information
-        width = struct.unpack("<H", file_data[8:10])[0]
-        height = struct.unpack("<H", file_data[10:12])[0]
-        data_format = struct.unpack("<H", file_data[12:14])[0]
+        width, height, data_format = struct.unpack_from("<HHH", header, 8)
 
-        image_data = file_data[TWS_HEADER_SIZE:]
+        max_mipmap_level = cls.check_size(
+            file_size - TWS_HEADER_SIZE, width, height, data_format
+        )
 
-        max_mipmap_level = cls.check_size(image_data, width, height, data_format)
+        return width, height, data_format, max_mipmap_level
 
-        return cls(image_data, width, height, data_format, max_mipmap_level)
+    @property
+    def layout(self) -> MipLayout:
+        return mip_layout(self.width, self.height, self.data_format)
 
     def to_bytes(self, original_data: bytes) -> bytes:
         return original_data[:TWS_HEADER_SIZE] + self.image_data
 
-    def to_png(self) -> bytes:
-        image = None
-        if self.data_format == FORMAT_BGR:
-            image = Image.frombytes(
-                "RGB", (self.width, self.height), self.image_data, "raw", "BGR"
-            ).convert("RGBA")
-        elif self.data_format == FORMAT_RGBA:
-            image = Image.frombytes("RGBA", (self.width, self.height), self.image_data)
-        elif self.data_format == FORMAT_BC1:
-            image = Image.frombytes(
-                "RGBA",
-                (self.width, self.height),
-                self.decode_bc1(self.image_data, self.width, self.height),
-            )
-        elif self.data_format == FORMAT_BC3_LIKE or self.data_format == FORMAT_BC3:
-            # Use the first level of mipmap data only for convert to PNG
-            level0_size = (self.width // 4) * (self.height // 4) * 16
-            level0_data = self.image_data[:level0_size]
-            image = Image.frombytes(
-                "RGBA",
-                (self.width, self.height),
-                self.decode_bc3(level0_data, self.width, self.height),
+    def to_png(self, compress_level: int = DEFAULT_PNG_COMPRESS_LEVEL) -> bytes:
+        result = io.BytesIO()
+        self.to_image().save(result, format="PNG", compress_level=compress_level)
+        return result.getvalue()
+
+    def level_size(self, level: int) -> tuple[int, int]:
+        """Get the width and height of a mipmap level."""
+
+        self._check_level(level)
+        return self.layout.level_sizes[level]
+
+    def level_data(self, level: int) -> bytes:
+        """Get the pixel or block data of a mipmap level."""
+
+        self._check_level(level)
+        offset, size = self.layout.level_range(level)
+        return self.image_data[offset : offset + size]
+
+    def _check_level(self, level: int):
+        if level < 0 or level > self.max_mipmap_level:
+            raise ValueError(
+                f"Invalid mipmap level: {level} (max {self.max_mipmap_level})"
             )
 
-        if image is None:
-            raise ValueError(f"Unsupported format: {self.data_format}, image is None")
+    def to_array(self, level: int = 0) -> np.ndarray:
+        """Decode a mipmap level into an RGBA array of shape (height, width, 4)."""
 
-        result = io.BytesIO()
-        image.save(result, format="PNG")
-        return result.getvalue()
+        width, height = self.level_size(level)
+        data = self.level_data(level)
+        if self.data_format == FORMAT_BGR:
+            bgr = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+            pixels = np.empty((height, width, 4), dtype=np.uint8)
+            pixels[..., :3] = bgr[..., ::-1]
+            pixels[..., 3] = 255
+            return pixels
+        if self.data_format == FORMAT_RGBA:
+            return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 4)
+        if self.data_format == FORMAT_BC1:
+            return decode_bc1(data, width, height)
+        if self.data_format == FORMAT_BC3_LIKE or self.data_format == FORMAT_BC3:
+            return decode_bc3(data, width, height)
+
+        raise ValueError(f"Unsupported format: {self.data_format}")
+
+    def to_image(self, level: int = 0) -> Image.Image:
+        """Decode a mipmap level into an image sharing the decoded pixels."""
+
+        pixels = self.to_array(level)
+        height, width = pixels.shape[:2]
+        return Image.frombuffer("RGBA", (width, height), pixels, "raw", "RGBA", 0, 1)
+
+    def load_from_image(
+        self,
+        image: Image.Image,
+        quality: str = "release",
+        cache: DiskCache | None = None,
+    ):
+        if quality not in TEXTURE_QUALITIES:
+            raise ValueError(f"Unsupported texture quality: {quality}")
+        compress_level = TEXTURE_QUALITIES[quality]
 
-    def load_from_image(self, image: Image.Image):
         new_image = b""
 
         if self.data_format == FORMAT_BGR:
@@ -88,95 +295,118 @@ class TwsFile:
         elif self.data_format == FORMAT_RGBA:
             new_image = image.convert("RGBA").tobytes("raw", "RGBA")
         elif self.data_format == FORMAT_BC1:
-            new_image = self.encode_bc1(
-                image.convert("RGBA").tobytes("raw", "RGBA"), self.width, self.height
+            new_image = self.encode_levels(
+                partial(self.encode_bc1, compress_level=compress_level),
+                [np.asarray(image.convert("RGBA"))],
+                self.layout,
+                cache,
+                f"bc1-{compress_level}",
             )
         elif self.data_format == FORMAT_BC3_LIKE or self.data_format == FORMAT_BC3:
-            mipmap_level = 0
-            mipmap_width = self.width
-            mipmap_height = self.height
-            new_image = b""
-            image = image.convert("RGBA")
-            while mipmap_level <= self.max_mipmap_level:
-                new_image += self.encode_bc3(
-                    image.tobytes("raw", "RGBA"),
-                    mipmap_width,
-                    mipmap_height,
-                )
-                mipmap_width = max(1, mipmap_width // 2)
-                mipmap_height = max(1, mipmap_height // 2)
-                mipmap_level += 1
-                image = image.resize((mipmap_width, mipmap_height), Image.LANCZOS)
+            mipmaps = mipmap_pyramid(
+                np.asarray(image.convert("RGBA")), self.max_mipmap_level + 1
+            )
+            new_image = self.encode_levels(
+                partial(self.encode_bc3, compress_level=compress_level),
+                mipmaps,
+                self.layout,
+                cache,
+                f"bc3-{compress_level}",
+            )
 
         if not new_image:
             raise ValueError(
                 f"Unsupported format: {self.data_format}, new_image is None"
             )
 
-        self.check_size(new_image, self.width, self.height, self.data_format)
+        self.check_size(len(new_image), self.width, self.height, self.data_format)
         self.image_data = new_image
 
+    def psnr(self, image: Image.Image) -> float | None:
+        """
+        Get the PSNR of the first mipmap level against `image`, in dB.
+
+        Returns None for uncompressed formats.
+        """
+
+        if self.data_format not in (FORMAT_BC1, FORMAT_BC3_LIKE, FORMAT_BC3):
+            return None
+
+        encoded = np.asarray(self.to_image(), dtype=np.float64)
+        source = np.asarray(image.convert("RGBA"), dtype=np.float64)
+        mse = np.mean((encoded - source) ** 2)
+        if mse == 0:
+            return float("inf")
+        return float(10 * np.log10(255**2 / mse))
+
     @staticmethod
-    def check_size(image_data: bytes, width: int, height: int, data_format: int) -> int:
+    def encode_levels(
+        encode: Callable[[bytes, int, int], bytes],
+        mipmaps: list[np.ndarray],
+        layout: MipLayout,
+        cache: DiskCache | None = None,
+        cache_key: str = "",
+    ) -> bytearray:
         """
-        Check the size of the image data based on the format and dimensions.
+        Encode RGBA mipmap levels with a block compression `encode` function,
+        into the first levels of a block compressed `layout`.
 
-        If the data format is BC3 or BC3_2, it will return the maximum mipmap level.
+        The levels are encoded directly into a single preallocated buffer. With
+        a `cache`, each level is looked up by its pixels and `cache_key`, which
+        must identify the encoder settings.
         """
 
-        max_mipmap_level = 0
+        if len(mipmaps) > layout.level_count:
+            raise ValueError(
+                f"Too many mipmap levels: {len(mipmaps)} / {layout.level_count}"
+            )
+        buffer = bytearray(layout.data_size(len(mipmaps)))
+        view = memoryview(buffer)
 
-        if data_format == FORMAT_BGR:
-            expected_size = width * height * 3
-            if len(image_data) != expected_size:
-                raise ValueError(
-                    f"Invalid image data size for FORMAT_RGB: {len(image_data)} / {expected_size}"
-                )
-        elif data_format == FORMAT_RGBA:
-            expected_size = width * height * 4
-            if len(image_data) != expected_size:
+        for level, pixels in enumerate(mipmaps):
+            height, width = pixels.shape[:2]
+            if (width, height) != layout.level_sizes[level]:
+                level_width, level_height = layout.level_sizes[level]
                 raise ValueError(
-                    f"Invalid image data size for FORMAT_RGBA: {len(image_data)} / {expected_size}"
+                    f"Invalid image size for mipmap level {level}: {width}x{height} / {level_width}x{level_height}"
                 )
-        elif data_format == FORMAT_BC1:
-            expected_size = (width // 4) * (height // 4) * 8
-            if len(image_data) != expected_size:
-                raise ValueError(
-                    f"Invalid image data size for FORMAT_BC1: {len(image_data)} / {expected_size}"
-                )
-        elif data_format == FORMAT_BC3_LIKE or data_format == FORMAT_BC3:
-            mipmap_level = 0
-            mipmap_width = width
-            mipmap_height = height
-            expected_size = (mipmap_width // 4) * (mipmap_height // 4) * 16
-            while len(image_data) >= expected_size:
-                # print(
-                #     f"mipmap level: {mipmap_level}, size: {mipmap_width}x{mipmap_height}, total expected size: {expected_size}"
-                # )
-                if len(image_data) == expected_size:
-                    break
-                mipmap_level += 1
-                mipmap_width = max(1, mipmap_width // 2)
-                mipmap_height = max(1, mipmap_height // 2)
-                expected_size += (mipmap_width // 4) * (mipmap_height // 4) * 16
-            if len(image_data) != expected_size:
-                raise ValueError(
-                    f"Invalid image data size for FORMAT_BC3({data_format}): {len(image_data)} / {expected_size}"
+            offset, size = layout.level_range(level)
+            if size == 0:
+                continue  # smaller than a block
+            pixel_data = memoryview(pixels.reshape(-1))
+
+            key = None
+            if cache is not None:
+                key = content_hash(
+                    f"bc-{TEXTURE_ENCODER_VERSION}-{cache_key}-{width}x{height}:".encode(),
+                    pixel_data,
                 )
-            max_mipmap_level = mipmap_level
-        else:
-            raise ValueError(f"Unsupported format: {data_format}")
+                data = cache.get(key)
+                if data is not None and len(data) == size:
+                    view[offset : offset + size] = data
+                    continue
+
+            data = encode(pixel_data, width, height)
+            if len(data) != size:
+                raise ValueError(f"Invalid encoded data size: {len(data)} / {size}")
+            view[offset : offset + size] = data
+            if key is not None:
+                cache.put(key, data)
 
-        return max_mipmap_level
+        view.release()
+        return buffer
 
     @staticmethod
-    def decode_bc1(buf: bytes, w: int, h: int) -> bytes:
-        texture = BC1Texture.from_bytes(buf, w, h)
-        decoder = BC1Decoder(
-            write_alpha=True,
-        )
-        raw_texture = decoder.decode(texture)
-        return raw_texture.tobytes()
+    def check_size(
+        image_data_size: int, width: int, height: int, data_format: int
+    ) -> int:
+        """
+        Check the size of the image data based on the format and dimensions.
+
+        If the data format is BC3 or BC3_2, it will return the maximum mipmap level.
+        """
+
+        return mip_layout(width, height, data_format).max_mipmap_level(image_data_size)
 
     @staticmethod
     def encode_bc1(buf: bytes, w: int, h: int, compress_level: int = 10) -> bytes:
@@ -187,13 +417,6 @@ class TwsFile:
         encoded_texture = encoder.encode(texture)
         return encoded_texture.tobytes()
 
-    @staticmethod
-    def decode_bc3(buf: bytes, w: int, h: int) -> bytes:
-        texture = BC3Texture.from_bytes(buf, w, h)
-        decoder = BC3Decoder()
-        raw_texture = decoder.decode(texture)
-        return raw_texture.tobytes()
-
     @staticmethod
     def encode_bc3(buf: bytes, w: int, h: int, compress_level: int = 10) -> bytes:
         texture = RawTexture.frombytes(buf, w, h)
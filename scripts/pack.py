@@ -1,10 +1,38 @@
 import argparse
 import os
+import shutil
 
-from libs.info import InfoDat
+from libs.gamedat import GameDatWriter
+from libs.info import FILE_BLOCK_SIZE, InfoDat
+from libs.manifest import MANIFEST_FILE_NAME
 from tqdm import tqdm
 
 
+def collect_overlay_files(extract_dir):
+    overlay = {}
+    for root, _, files in os.walk(extract_dir):
+        for file in files:
+            if file == MANIFEST_FILE_NAME:
+                continue
+            file_path = os.path.join(root, file)
+            name = os.path.relpath(file_path, extract_dir).replace(os.sep, "/")
+            overlay[name] = file_path
+    return overlay
+
+
+def find_overlay_entries(info_dat, overlay):
+    """Look up the INFO.DAT entries of the overlay files, in archive order."""
+
+    indices = []
+    for name in sorted(overlay):
+        index = info_dat.index_of(name)
+        if index is None:
+            print(f"Skipping {name}: not found in INFO.DAT")
+            continue
+        indices.append(index)
+    return [info_dat.entry(index) for index in sorted(indices)]
+
+
 def pack(info_path, original_extract_dir, extract_dir, output_dir):
     os.makedirs(output_dir, exist_ok=True)
     new_info_path = os.path.join(output_dir, "INFO.DAT")
@@ -14,12 +42,12 @@ def pack(info_path, original_extract_dir, extract_dir, output_dir):
         info_data = f.read()
     info_dat = InfoDat.from_encrypted_bytes(info_data)
 
+    overlay = collect_overlay_files(extract_dir)
+
     # Update entries with new file data
-    for entry in info_dat.entries:
-        if not os.path.exists(os.path.join(extract_dir, entry.name)):
-            continue
+    for entry in find_overlay_entries(info_dat, overlay):
         print(f"Updating {entry.name}...")
-        with open(os.path.join(extract_dir, entry.name), "rb") as f:
+        with open(overlay[entry.name], "rb") as f:
             file_data = f.read()
         entry.update_info(file_data)
 
@@ -31,35 +59,214 @@ def pack(info_path, original_extract_dir, extract_dir, output_dir):
         f.write(info_dat.to_encrypted_bytes())
 
     # Write new GAME.DAT file
-    with open(new_game_path, "wb") as new_game_file:
-        with tqdm(total=info_dat.file_count, desc="Packing files") as pbar:
-            for entry in info_dat.entries:
-                pbar.set_postfix_str(f"Packing: {entry.name:<32}")
-
-                original_file_path = os.path.join(original_extract_dir, entry.name)
-                new_file_path = os.path.join(extract_dir, entry.name)
-                file_data = None
-
-                if not os.path.exists(original_file_path):
-                    raise ValueError(
-                        f"Error: {entry.name} - Original file does not exist"
-                    )
-
-                if not os.path.exists(new_file_path):
-                    # Use original file if new file does not exist
-                    with open(original_file_path, "rb") as f:
-                        file_data = f.read()
-                else:
-                    # Use new file if it exists
-                    with open(new_file_path, "rb") as f:
-                        file_data = f.read()
-
-                if file_data is None:
-                    raise ValueError(f"Error: {entry.name} - Failed to read data")
-
-                entry.write_to_game_file(new_game_file, file_data)
+    with (
+        open(new_game_path, "wb") as new_game_file,
+        GameDatWriter(new_game_file, info_dat.end_block()) as writer,
+        tqdm(total=info_dat.file_count, desc="Packing files") as pbar,
+    ):
+        for name, block_offset, block_count in zip(
+            info_dat.names,
+            info_dat.table["block_offset"].tolist(),
+            info_dat.table["block_count"].tolist(),
+        ):
+            pbar.set_postfix_str(f"Packing: {name:<32}")
+
+            original_file_path = os.path.join(original_extract_dir, name)
+            file_data = None
+
+            if not os.path.exists(original_file_path):
+                raise ValueError(f"Error: {name} - Original file does not exist")
+
+            if name not in overlay:
+                # Use original file if new file does not exist
+                with open(original_file_path, "rb") as f:
+                    file_data = f.read()
+            else:
+                # Use new file if it exists
+                with open(overlay[name], "rb") as f:
+                    file_data = f.read()
+
+            if file_data is None:
+                raise ValueError(f"Error: {name} - Failed to read data")
+
+            if block_count > 0:
+                writer.write(block_offset, file_data)
+
+            pbar.update(1)
+    print("Packing completed")
+
+
+def read_overlay_file(source):
+    if isinstance(source, bytes):
+        return source
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def pack_from_archive(info_path, game_path, extract_dir, output_dir):
+    """
+    Pack directly from the original INFO.DAT/GAME.DAT pair.
+
+    Only the files in `extract_dir` are read from disk. Unmodified entries are
+    copied from the original GAME.DAT, merging adjacent entries into one copy.
+    """
+
+    overlay = collect_overlay_files(extract_dir)
+    pack_overlay(info_path, game_path, overlay, output_dir)
+
+
+def pack_overlay(info_path, game_path, overlay, output_dir):
+    """
+    Pack the original game files with the entries in `overlay` replaced.
+
+    `overlay` maps entry names to either a file path or the file data.
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    new_info_path = os.path.join(output_dir, "INFO.DAT")
+    new_game_path = os.path.join(output_dir, "GAME.DAT")
+
+    with open(info_path, "rb") as f:
+        info_data = f.read()
+    info_dat = InfoDat.from_encrypted_bytes(info_data)
+    overlay_entries = find_overlay_entries(info_dat, overlay)
+
+    # Keep the original offsets to locate unmodified entries in GAME.DAT
+    original_offsets = info_dat.table["block_offset"].tolist()
+
+    # Update entries with new file sizes
+    for entry in overlay_entries:
+        print(f"Updating {entry.name}...")
+        source = overlay[entry.name]
+        if isinstance(source, bytes):
+            entry.update_size(len(source))
+        else:
+            entry.update_size(os.path.getsize(source))
+
+    # Recalculate block offsets
+    info_dat.recalculate_offsets()
+
+    # Save new INFO.DAT file
+    with open(new_info_path, "wb") as f:
+        f.write(info_dat.to_encrypted_bytes())
+
+    # Write new GAME.DAT file
+    with (
+        open(game_path, "rb") as game_file,
+        open(new_game_path, "wb") as new_game_file,
+        GameDatWriter(new_game_file, info_dat.end_block()) as writer,
+        tqdm(total=info_dat.file_count, desc="Packing files") as pbar,
+    ):
+        # Pending run of unmodified entries as (source block, target block,
+        # block count, size of the last entry in the run)
+        run = None
 
+        def flush_run():
+            nonlocal run
+            if run is None:
+                return
+            src_block, dst_block, block_count, last_size = run
+            writer.copy(
+                game_file,
+                src_block * FILE_BLOCK_SIZE,
+                dst_block,
+                (block_count - 1) * FILE_BLOCK_SIZE + last_size,
+            )
+            run = None
+
+        for name, size, block_offset, block_count, original_offset in zip(
+            info_dat.names,
+            info_dat.table["size"].tolist(),
+            info_dat.table["block_offset"].tolist(),
+            info_dat.table["block_count"].tolist(),
+            original_offsets,
+        ):
+            pbar.set_postfix_str(f"Packing: {name:<32}")
+
+            if block_count == 0:
                 pbar.update(1)
+                continue
+
+            if name in overlay:
+                flush_run()
+                file_data = read_overlay_file(overlay[name])
+                writer.write(block_offset, file_data)
+            elif (
+                run is not None
+                and original_offset == run[0] + run[2]
+                and block_offset == run[1] + run[2]
+            ):
+                # Contiguous in both archives: extend the pending copy.
+                # Only the last entry of a run may end in a partial block.
+                run = (
+                    run[0],
+                    run[1],
+                    run[2] + block_count,
+                    size - (block_count - 1) * FILE_BLOCK_SIZE,
+                )
+            else:
+                flush_run()
+                run = (
+                    original_offset,
+                    block_offset,
+                    block_count,
+                    size - (block_count - 1) * FILE_BLOCK_SIZE,
+                )
+
+            pbar.update(1)
+        flush_run()
+    print("Packing completed")
+
+
+def pack_in_place(info_path, game_path, extract_dir, output_dir):
+    """
+    Patch the packed game files in `output_dir` without rewriting GAME.DAT.
+
+    The original INFO.DAT/GAME.DAT are copied to `output_dir` on first use.
+    Files that still fit their block allocation are overwritten in place, and
+    files that grew are appended to the end of GAME.DAT.
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    new_info_path = os.path.join(output_dir, "INFO.DAT")
+    new_game_path = os.path.join(output_dir, "GAME.DAT")
+
+    if not (os.path.exists(new_info_path) and os.path.exists(new_game_path)):
+        print("Copying original game files...")
+        shutil.copyfile(info_path, new_info_path)
+        shutil.copyfile(game_path, new_game_path)
+
+    with open(new_info_path, "rb") as f:
+        info_data = f.read()
+    info_dat = InfoDat.from_encrypted_bytes(info_data)
+
+    overlay = collect_overlay_files(extract_dir)
+    overlay_entries = find_overlay_entries(info_dat, overlay)
+
+    end_block = info_dat.end_block()
+
+    with open(new_game_path, "r+b") as game_file:
+        for entry in overlay_entries:
+            with open(overlay[entry.name], "rb") as f:
+                file_data = f.read()
+
+            old_block_offset = entry.block_offset
+            old_block_count = entry.block_count
+            entry.update_info(file_data)
+
+            if entry.block_count <= old_block_count:
+                print(f"Updating {entry.name} in place...")
+                entry.block_offset = old_block_offset
+            else:
+                print(f"Appending {entry.name}...")
+                entry.block_offset = end_block
+                end_block += entry.block_count
+
+            entry.write_to_game_file(game_file, file_data)
+
+    # Save new INFO.DAT file
+    with open(new_info_path, "wb") as f:
+        f.write(info_dat.to_encrypted_bytes())
     print("Packing completed")
 
 
@@ -74,6 +281,12 @@ if __name__ == "__main__":
         default="resources/original_gamefiles/INFO.DAT",
         help="Path of original INFO.DAT",
     )
+    parser.add_argument(
+        "--game_path",
+        type=str,
+        default="resources/original_gamefiles/GAME.DAT",
+        help="Path of original GAME.DAT (used with --from_archive and --in_place)",
+    )
     parser.add_argument(
         "--original_extract_dir",
         type=str,
@@ -92,11 +305,36 @@ if __name__ == "__main__":
         default="resources/packed_gamefiles",
         help="Output directory path",
     )
+    parser.add_argument(
+        "--from_archive",
+        action="store_true",
+        help="Copy unmodified files from the original GAME.DAT instead of original_extract_dir",
+    )
+    parser.add_argument(
+        "--in_place",
+        action="store_true",
+        help="Patch the game files in output_dir in place (copied from the originals on first use)",
+    )
     args = parser.parse_args()
 
-    pack(
-        args.info_path,
-        args.original_extract_dir,
-        args.extract_dir,
-        args.output_dir,
-    )
+    if args.in_place:
+        pack_in_place(
+            args.info_path,
+            args.game_path,
+            args.extract_dir,
+            args.output_dir,
+        )
+    elif args.from_archive:
+        pack_from_archive(
+            args.info_path,
+            args.game_path,
+            args.extract_dir,
+            args.output_dir,
+        )
+    else:
+        pack(
+            args.info_path,
+            args.original_extract_dir,
+            args.extract_dir,
+            args.output_dir,
+        )
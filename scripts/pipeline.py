@@ -0,0 +1,452 @@
+import argparse
+import os
+from functools import partial
+
+from libs.alz import ALZ_LEVELS
+from libs.alz_batch import alz_decompress_many
+from libs.archive import open_worker_archive, worker_archive
+from libs.cache import DiskCache, alz_compress_cached
+from libs.hashing import content_hash, pixel_hash
+from libs.info import InfoDat
+from libs.manifest import find_baseline_pixel_hash, load_manifest, update_manifest
+from libs.parallel import batch_by_size, default_jobs, item_errors, run_parallel
+from libs.texture_file import (
+    DEFAULT_PNG_COMPRESS_LEVEL,
+    TEXTURE_FILE_FORMATS,
+    open_texture,
+    save_texture,
+    texture_file_format,
+)
+from libs.tws import TEXTURE_QUALITIES, TwsFile
+from pack import collect_overlay_files, pack_overlay
+
+# Small entries are decompressed in batches of up to this many bytes, to avoid
+# the per-file overhead
+MAX_BATCH_SIZE = 0x100000  # 1 MiB
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def unpack_entry(
+    name,
+    decompressed_data,
+    output_dir,
+    texture_dir,
+    keep_twx,
+    texture_format,
+    png_compress_level,
+):
+    """Write a decompressed entry, returning the hashes of its data and pixels."""
+
+    data_hash = content_hash(decompressed_data)
+
+    if not name.lower().endswith(".twx"):
+        write_file(os.path.join(output_dir, name), decompressed_data)
+        return data_hash, None
+
+    if keep_twx:
+        write_file(os.path.join(output_dir, name), decompressed_data)
+    image = TwsFile.from_bytes(decompressed_data).to_image()
+    output_file_path = os.path.join(texture_dir, f"{name}.{texture_format}")
+    os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+    save_texture(image, output_file_path, texture_format, png_compress_level)
+    return data_hash, pixel_hash(image)
+
+
+def unpack_entries(
+    names,
+    output_dir,
+    texture_dir,
+    extract_dir,
+    keep_twx,
+    texture_format,
+    png_compress_level,
+):
+    """Unpack a batch of entries, returning the hashes of their data and pixels."""
+
+    archive = worker_archive()
+    file_datas = []
+    for name in names:
+        with item_errors(name), archive.read(name) as file_data:
+            if extract_dir is not None:
+                write_file(os.path.join(extract_dir, name), file_data)
+            file_datas.append(file_data.tobytes())
+
+    results = []
+    for name, decompressed_data in zip(names, alz_decompress_many(file_datas)):
+        with item_errors(name):
+            results.append(
+                unpack_entry(
+                    name,
+                    decompressed_data,
+                    output_dir,
+                    texture_dir,
+                    keep_twx,
+                    texture_format,
+                    png_compress_level,
+                )
+            )
+    return results
+
+
+def unpack(
+    info_path,
+    game_path,
+    output_dir,
+    texture_dir,
+    extract_dir=None,
+    keep_twx=False,
+    pattern=None,
+    jobs=None,
+    texture_format="png",
+    png_compress_level=DEFAULT_PNG_COMPRESS_LEVEL,
+):
+    """
+    Unpack, decompress and convert the game files in a single pass.
+
+    Textures are only written as `texture_format` files unless `keep_twx` is
+    set, and the compressed files are only written if `extract_dir` is given.
+    """
+
+    with open(info_path, "rb") as f:
+        info_data = f.read()
+    info_dat = InfoDat.from_encrypted_bytes(info_data)
+    indices = info_dat.glob_indices(pattern)
+
+    names = [info_dat.names[i] for i in indices]
+    sizes = dict(zip(names, info_dat.table["size"][indices].tolist()))
+    batches = batch_by_size(names, list(sizes.values()), MAX_BATCH_SIZE)
+    batch_results = run_parallel(
+        partial(
+            unpack_entries,
+            output_dir=output_dir,
+            texture_dir=texture_dir,
+            extract_dir=extract_dir,
+            keep_twx=keep_twx,
+            texture_format=texture_format,
+            png_compress_level=png_compress_level,
+        ),
+        batches,
+        jobs,
+        desc="Unpacking files",
+        sizes=[sum(sizes[name] for name in batch) for batch in batches],
+        initializer=open_worker_archive,
+        initargs=(info_path, game_path),
+    )
+    results = [result for results in batch_results for result in results]
+    update_manifest(
+        output_dir,
+        {
+            name: data_hash
+            for name, (data_hash, image_hash) in zip(names, results)
+            if image_hash is None or keep_twx
+        },
+    )
+    update_manifest(
+        texture_dir,
+        {
+            name: image_hash
+            for name, (_, image_hash) in zip(names, results)
+            if image_hash is not None
+        },
+    )
+    print("Unpacking completed")
+
+
+def repack_texture(
+    file_path,
+    texture_dir,
+    baseline_dir,
+    baseline_hashes,
+    level,
+    cache,
+    quality,
+    texture_cache,
+):
+    name = file_path[:-4]
+    with open_texture(os.path.join(texture_dir, file_path)) as image:
+        if baseline_dir is not None:
+            baseline_hash = find_baseline_pixel_hash(
+                baseline_dir, baseline_hashes, name, file_path
+            )
+            if baseline_hash == pixel_hash(image):
+                return None
+
+        original_data = worker_archive().decompressed(name)
+        tws_file = TwsFile.from_bytes(original_data)
+        tws_file.load_from_image(image, quality, texture_cache)
+    return alz_compress_cached(tws_file.to_bytes(original_data), cache, level)
+
+
+def repack_data(name, data_dir, level, cache):
+    with open(os.path.join(data_dir, name), "rb") as f:
+        file_data = f.read()
+    if worker_archive().read_if_unchanged(name, file_data) is not None:
+        return None
+    return alz_compress_cached(file_data, cache, level)
+
+
+def repack(
+    info_path,
+    game_path,
+    texture_dir,
+    data_dir,
+    output_dir,
+    jobs=None,
+    cache_dir=None,
+    cache_size=0,
+    baseline_dir=None,
+    level="default",
+    quality="release",
+    texture_cache_dir=None,
+):
+    """
+    Convert, compress and pack the edited files in a single pass.
+
+    PNG (or TGA/NPY) files in `texture_dir` and data files in `data_dir`
+    replace the original entries; everything else is copied from the original
+    GAME.DAT. Data files identical to the original and textures whose pixels
+    match the same texture in `baseline_dir` are left out.
+    """
+
+    cache = DiskCache(cache_dir, cache_size) if cache_dir is not None else None
+    texture_cache = (
+        DiskCache(texture_cache_dir, cache_size)
+        if texture_cache_dir is not None
+        else None
+    )
+    baseline_hashes = load_manifest(baseline_dir) if baseline_dir is not None else {}
+
+    texture_files = sorted(
+        name
+        for name in collect_overlay_files(texture_dir)
+        if texture_file_format(name) is not None
+    )
+    data_files = collect_overlay_files(data_dir)
+    data_names = sorted(data_files)
+
+    overlay = {}
+    results = run_parallel(
+        partial(repack_data, data_dir=data_dir, level=level, cache=cache),
+        data_names,
+        jobs,
+        desc="Compressing files",
+        sizes=[os.path.getsize(data_files[name]) for name in data_names],
+        initializer=open_worker_archive,
+        initargs=(info_path, game_path),
+    )
+    for name, compressed_data in zip(data_names, results):
+        # Unmodified files are left out and copied from GAME.DAT as usual
+        if compressed_data is not None:
+            overlay[name] = compressed_data
+
+    results = run_parallel(
+        partial(
+            repack_texture,
+            texture_dir=texture_dir,
+            baseline_dir=baseline_dir,
+            baseline_hashes=baseline_hashes,
+            level=level,
+            cache=cache,
+            quality=quality,
+            texture_cache=texture_cache,
+        ),
+        texture_files,
+        jobs,
+        desc="Processing texture files",
+        sizes=[
+            os.path.getsize(os.path.join(texture_dir, name)) for name in texture_files
+        ],
+        initializer=open_worker_archive,
+        initargs=(info_path, game_path),
+    )
+    for file_path, compressed_data in zip(texture_files, results):
+        if compressed_data is not None:
+            overlay[file_path[:-4]] = compressed_data
+    for disk_cache in (cache, texture_cache):
+        if disk_cache is not None:
+            disk_cache.evict()
+
+    pack_overlay(info_path, game_path, overlay, output_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="TGM4 Unpack/Repack Pipeline",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--info_path",
+        type=str,
+        default="resources/original_gamefiles/INFO.DAT",
+        help="Path of original INFO.DAT",
+    )
+    parser.add_argument(
+        "--game_path",
+        type=str,
+        default="resources/original_gamefiles/GAME.DAT",
+        help="Path of original GAME.DAT",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Number of worker processes",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    unpack_parser = subparsers.add_parser(
+        "unpack",
+        help="Unpack the game files straight to data files and PNG textures",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    unpack_parser.add_argument(
+        "--output_dir",
+        type=str,
+        default="resources/decompressed_resources",
+        help="Output directory path of decompressed (non-texture) files",
+    )
+    unpack_parser.add_argument(
+        "--texture_dir",
+        type=str,
+        default="resources/extracted_textures",
+        help="Output directory (PNG files will be saved here)",
+    )
+    unpack_parser.add_argument(
+        "--texture_format",
+        type=str,
+        choices=TEXTURE_FILE_FORMATS,
+        default="png",
+        help="Texture file format (tga and npy are uncompressed, for automated round trips)",
+    )
+    unpack_parser.add_argument(
+        "--png_compress_level",
+        type=int,
+        choices=range(10),
+        default=DEFAULT_PNG_COMPRESS_LEVEL,
+        metavar="{0..9}",
+        help="zlib compression level of PNG files (0 is the fastest)",
+    )
+    unpack_parser.add_argument(
+        "--extract_dir",
+        type=str,
+        default=None,
+        help="Also save the compressed files to this directory",
+    )
+    unpack_parser.add_argument(
+        "--keep_twx",
+        action="store_true",
+        help="Also save the decompressed TWX files to output_dir",
+    )
+    unpack_parser.add_argument(
+        "--pattern",
+        type=str,
+        default=None,
+        help="Only unpack files matching this pattern (e.g. 'ui/*.twx')",
+    )
+
+    repack_parser = subparsers.add_parser(
+        "repack",
+        help="Repack edited data files and PNG textures into new game files",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    repack_parser.add_argument(
+        "--texture_dir",
+        type=str,
+        default="resources/extracted_textures",
+        help="Directory containing edited PNG (or TGA/NPY) files",
+    )
+    repack_parser.add_argument(
+        "--data_dir",
+        type=str,
+        default="resources/decompressed_resources_edited",
+        help="Directory containing edited decompressed (non-texture) files",
+    )
+    repack_parser.add_argument(
+        "--output_dir",
+        type=str,
+        default="resources/packed_gamefiles",
+        help="Output directory path",
+    )
+    repack_parser.add_argument(
+        "--level",
+        type=str,
+        choices=list(ALZ_LEVELS),
+        default="default",
+        help="Compression level",
+    )
+    repack_parser.add_argument(
+        "--quality",
+        type=str,
+        choices=list(TEXTURE_QUALITIES),
+        default="release",
+        help="Texture encoding quality (draft is about 4x and normal 1.5x faster than release)",
+    )
+    repack_parser.add_argument(
+        "--baseline_dir",
+        type=str,
+        default="resources/extracted_textures_backup",
+        help="Directory containing original PNG files (unmodified PNG files are skipped)",
+    )
+    repack_parser.add_argument(
+        "--no_skip",
+        action="store_true",
+        help="Convert all PNG files, even if they are unmodified",
+    )
+    repack_parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default="resources/cache/alz",
+        help="Directory of the compression cache",
+    )
+    repack_parser.add_argument(
+        "--texture_cache_dir",
+        type=str,
+        default="resources/cache/textures",
+        help="Directory of the encoded texture cache",
+    )
+    repack_parser.add_argument(
+        "--cache_size",
+        type=int,
+        default=1024,
+        help="Maximum size of each cache in MiB",
+    )
+    repack_parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Disable the caches",
+    )
+    args = parser.parse_args()
+
+    if args.command == "unpack":
+        unpack(
+            args.info_path,
+            args.game_path,
+            args.output_dir,
+            args.texture_dir,
+            args.extract_dir,
+            args.keep_twx,
+            args.pattern,
+            args.jobs,
+            args.texture_format,
+            args.png_compress_level,
+        )
+    else:
+        repack(
+            args.info_path,
+            args.game_path,
+            args.texture_dir,
+            args.data_dir,
+            args.output_dir,
+            args.jobs,
+            None if args.no_cache else args.cache_dir,
+            args.cache_size * 1024 * 1024,
+            None if args.no_skip else args.baseline_dir,
+            args.level,
+            args.quality,
+            None if args.no_cache else args.texture_cache_dir,
+        )
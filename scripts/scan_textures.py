@@ -0,0 +1,117 @@
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+from libs.archive import GameArchive
+from libs.tws import TWS_HEADER_SIZE, TwsFile
+
+TEXTURE_HEADER_DTYPE = np.dtype(
+    [
+        ("name", "U32"),
+        ("size", np.int64),
+        ("decompressed_size", np.int64),
+        ("width", np.int32),
+        ("height", np.int32),
+        ("data_format", np.int32),
+        ("mipmap_count", np.int32),
+    ]
+)
+
+
+def scan_textures(info_path, game_path, pattern=None) -> np.ndarray:
+    """
+    Read the header of every TWX file in the game files into a table.
+
+    Only the first bytes of each file are decompressed, and the image data is
+    never decoded. The mipmap count is derived from the decompressed size.
+    """
+
+    with GameArchive(info_path, game_path) as archive:
+        info_dat = archive.info_dat
+        indices = [
+            i
+            for i in info_dat.glob_indices(pattern)
+            if info_dat.names[i].lower().endswith(".twx")
+        ]
+        heads, sizes = archive.decompressed_heads(indices, TWS_HEADER_SIZE)
+        names = [info_dat.names[i] for i in indices]
+        compressed_sizes = info_dat.table["size"][indices].tolist()
+
+    rows = []
+    for name, compressed_size, head, size in zip(
+        names, compressed_sizes, heads, sizes.tolist()
+    ):
+        try:
+            width, height, data_format, max_mipmap_level = TwsFile.peek_header(
+                head.tobytes(), size
+            )
+        except ValueError as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        rows.append(
+            (
+                name,
+                compressed_size,
+                size,
+                width,
+                height,
+                data_format,
+                max_mipmap_level + 1,
+            )
+        )
+    return np.array(rows, dtype=TEXTURE_HEADER_DTYPE)
+
+
+def save_table(table, output_path):
+    """Save the table as a NumPy structured array (.npy) or as CSV."""
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if output_path.lower().endswith(".npy"):
+        np.save(output_path, table)
+        return
+
+    with open(output_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(table.dtype.names)
+        writer.writerows(table.tolist())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="TGM4 TWX Header Scanner",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--info_path",
+        type=str,
+        default="resources/original_gamefiles/INFO.DAT",
+        help="Path of original INFO.DAT",
+    )
+    parser.add_argument(
+        "--game_path",
+        type=str,
+        default="resources/original_gamefiles/GAME.DAT",
+        help="Path of original GAME.DAT",
+    )
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default="resources/texture_headers.csv",
+        help="Output file path (.csv, or .npy for a NumPy structured array)",
+    )
+    parser.add_argument(
+        "--pattern",
+        type=str,
+        default=None,
+        help="Only scan files matching this pattern (e.g. 'ui/*.twx')",
+    )
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    table = scan_textures(args.info_path, args.game_path, args.pattern)
+    save_table(table, args.output_path)
+    print(f"Scanned {len(table)} textures in {time.perf_counter() - start_time:.3f}s")
@@ -1,32 +1,43 @@
 import argparse
 import os
+from functools import partial
 
+from libs.archive import open_worker_archive, worker_archive
+from libs.hashing import content_hash
 from libs.info import InfoDat
-from tqdm import tqdm
+from libs.manifest import update_manifest
+from libs.parallel import default_jobs, run_parallel
 
 
-def unpack(info_path, game_path, output_dir):
+def unpack_file(output_dir, name):
+    archive = worker_archive()
+    output_file_path = os.path.join(output_dir, name)
+    os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+    with archive.read(name) as file_data, open(output_file_path, "wb") as output_file:
+        output_file.write(file_data)
+        return content_hash(file_data)
+
+
+def unpack(info_path, game_path, output_dir, pattern=None, jobs=None):
     os.makedirs(output_dir, exist_ok=True)
 
     with open(info_path, "rb") as f:
         info_data = f.read()
     info_dat = InfoDat.from_encrypted_bytes(info_data)
+    indices = info_dat.glob_indices(pattern)
 
     # Extract files
-    with open(game_path, "rb") as game_file:
-        with tqdm(total=info_dat.file_count, desc="Unpacking files") as pbar:
-            for entry in info_dat.entries:
-                pbar.set_postfix_str(f"Unpacking: {entry.name:<32}")
-                file_data = entry.read_from_game_file(game_file)
-                if file_data is None:
-                    raise ValueError(
-                        f"Error: {entry.name} - Failed to read data from GAME.DAT"
-                    )
-                output_file_path = os.path.join(output_dir, entry.name)
-                os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
-                with open(output_file_path, "wb") as output_file:
-                    output_file.write(file_data)
-                pbar.update(1)
+    names = [info_dat.names[i] for i in indices]
+    hashes = run_parallel(
+        partial(unpack_file, output_dir),
+        names,
+        jobs,
+        desc="Unpacking files",
+        sizes=info_dat.table["size"][indices].tolist(),
+        initializer=open_worker_archive,
+        initargs=(info_path, game_path),
+    )
+    update_manifest(output_dir, dict(zip(names, hashes)))
     print("Unpacking completed")
 
 
@@ -53,10 +64,24 @@ if __name__ == "__main__":
         default="resources/extracted_resources",
         help="Output directory path",
     )
+    parser.add_argument(
+        "--pattern",
+        type=str,
+        default=None,
+        help="Only extract files matching this pattern (e.g. 'ui/*.twx')",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Number of worker processes",
+    )
     args = parser.parse_args()
 
     unpack(
         args.info_path,
         args.game_path,
         args.output_dir,
+        args.pattern,
+        args.jobs,
     )
@@ -0,0 +1,71 @@
+import argparse
+import time
+
+start_time = time.perf_counter()
+from libs import alz
+
+import_time = time.perf_counter() - start_time
+
+import numpy as np
+from libs import alz_batch
+
+KERNELS = [
+    (alz, "alz_scan_decompressed_size_numba"),
+    (alz, "alz_decompressed_size_numba"),
+    (alz, "alz_decompress_into_numba"),
+    (alz, "alz_compress_numba"),
+    (alz, "alz_decompress_stream_numba"),
+    (alz_batch, "alz_compress_many_numba"),
+    (alz_batch, "alz_decompressed_sizes_numba"),
+    (alz_batch, "alz_decompress_many_numba"),
+    (alz_batch, "alz_decompress_heads_numba"),
+]
+
+
+def warmup():
+    """
+    Compile (or load from the cache) every ALZ kernel and report the time taken.
+
+    The decompression kernels are compiled when `libs.alz` is imported, and
+    the others (the compressor and the batch kernels) on their first call. All
+    of them are saved to the Numba cache for the next runs.
+    """
+
+    print(f"Importing libs.alz: {import_time:.3f}s")
+
+    # Kernels without a signature are compiled on the first call
+    sample = b"TGM4 warmup " * 64
+    for level in alz.ALZ_LEVELS:
+        call_start = time.perf_counter()
+        compressed_data = alz.alz_compress(sample, level)
+        if alz.alz_decompress(compressed_data) != sample:
+            raise RuntimeError(f"Round trip failed at level {level}")
+        print(f"First call at level {level}: {time.perf_counter() - call_start:.3f}s")
+
+    call_start = time.perf_counter()
+    compressed_data = alz_batch.alz_compress_many([sample, sample[:10]])[0]
+    alz_batch.alz_decompress_many([compressed_data])
+    alz_batch.alz_decompress_heads_numba(
+        np.frombuffer(compressed_data.tobytes(), dtype=np.uint8),
+        np.zeros(1, dtype=np.int64),
+        np.full(1, len(compressed_data), dtype=np.int64),
+        np.zeros((1, 16), dtype=np.uint8),
+    )
+    print(f"First batch call: {time.perf_counter() - call_start:.3f}s")
+
+    print(f"{'kernel':<36}{'signatures':>12}{'cache hits':>12}{'compiled':>10}")
+    for module, name in KERNELS:
+        kernel = getattr(module, name)
+        hits = sum(kernel.stats.cache_hits.values())
+        misses = sum(kernel.stats.cache_misses.values())
+        print(f"{name:<36}{len(kernel.signatures):>12}{hits:>12}{misses:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="TGM4 Numba Kernel Warm-up",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.parse_args()
+
+    warmup()
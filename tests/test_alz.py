@@ -0,0 +1,218 @@
+import random
+import struct
+
+import numpy as np
+import pytest
+from libs.alz import (
+    ALZ_LEVELS,
+    AlzCompressor,
+    AlzDecompressor,
+    alz_compress,
+    alz_decompress,
+    alz_decompressed_size,
+)
+from libs.alz_batch import (
+    alz_compress_many,
+    alz_decompress_heads_numba,
+    alz_decompress_many,
+)
+
+
+def reference_alz_decompress(data: bytes) -> bytes:
+    """The original window-based decoder, ignoring the size in the extended header."""
+
+    if len(data) < 4 or data[:3] != b"ALZ" or (data[3] & 0x7F) != 0x31:
+        return data
+
+    hdr_len = 8 if data[3] & 0x80 else 4
+    src = data[hdr_len:]
+    window = bytearray(0x1000)
+    win_pos = 0xFEE
+    out = bytearray()
+
+    src_pos = 0
+    flags = 0
+    while src_pos < len(src):
+        flags >>= 1
+        if (flags & 0x100) == 0:
+            flags = src[src_pos] | 0xFF00
+            src_pos += 1
+        if src_pos >= len(src):
+            break
+
+        if flags & 1:  # literal
+            byte = src[src_pos]
+            src_pos += 1
+            out.append(byte)
+            window[win_pos] = byte
+            win_pos = (win_pos + 1) & 0xFFF
+        else:  # back-reference
+            if src_pos + 1 >= len(src):
+                break
+            b1 = src[src_pos]
+            b2 = src[src_pos + 1]
+            src_pos += 2
+            offset = ((b2 & 0xF0) << 4) | b1
+            for i in range((b2 & 0x0F) + 3):
+                byte = window[(offset + i) & 0xFFF]
+                out.append(byte)
+                window[win_pos] = byte
+                win_pos = (win_pos + 1) & 0xFFF
+    return bytes(out)
+
+
+def sample_data() -> dict[str, bytes]:
+    rng = random.Random(0)
+    words = [bytes(rng.choices(b"abcdefgh", k=rng.randint(2, 9))) for _ in range(60)]
+    text = b" ".join(rng.choice(words) for _ in range(4000))
+    return {
+        "empty": b"",
+        "one_byte": b"x",
+        "short": b"abcabcabc",
+        "zeros": bytes(5000),  # also matches the zero-filled initial window
+        "random": rng.randbytes(3000),  # incompressible, stored as is
+        "two_symbols": bytes(rng.choices(b"ab", k=12000)),
+        "text": text,  # longer than the 4 KB window
+        "runs": b"".join(bytes([i % 7]) * (i % 40 + 1) for i in range(600)),
+    }
+
+
+SAMPLES = sample_data()
+
+
+def stream_compress(data: bytes) -> bytes:
+    compressor = AlzCompressor()
+    return compressor.compress(data) + compressor.flush()
+
+
+def with_extended_header(compressed_data: bytes, size: int) -> bytes:
+    """Rewrite a 4-byte ALZ header as an extended header holding `size`."""
+
+    return b"ALZ\xb1" + struct.pack("<I", size) + compressed_data[4:]
+
+
+@pytest.mark.parametrize("level", list(ALZ_LEVELS))
+@pytest.mark.parametrize("name", list(SAMPLES))
+def test_round_trip_at_each_level(level, name):
+    data = SAMPLES[name]
+    compressed_data = alz_compress(data, level)
+
+    assert len(compressed_data) <= max(len(data), 4)
+    assert alz_decompress(compressed_data) == data
+    assert reference_alz_decompress(compressed_data) == data
+    assert alz_decompressed_size(compressed_data) == len(data)
+
+
+def test_levels_compress_at_least_as_well_as_faster_levels():
+    data = SAMPLES["text"]
+    sizes = [len(alz_compress(data, level)) for level in ALZ_LEVELS]
+    assert sizes == sorted(sizes, reverse=True)
+
+
+@pytest.mark.parametrize(
+    "level", [level for level, (_, _, optimal) in ALZ_LEVELS.items() if not optimal]
+)
+@pytest.mark.parametrize("chunk_size", [1, 7, 18, 19, 1000, 4096, None])
+@pytest.mark.parametrize("name", ["empty", "short", "random", "text", "runs"])
+def test_streaming_compress(level, chunk_size, name):
+    data = SAMPLES[name]
+    chunk_size = chunk_size or max(1, len(data))
+
+    compressor = AlzCompressor(level)
+    chunks = [
+        compressor.compress(data[start : start + chunk_size])
+        for start in range(0, len(data), chunk_size)
+    ]
+    compressed_data = b"".join(chunks) + compressor.flush()
+
+    assert compressed_data[:4] == b"ALZ\x31"
+    assert alz_decompress(compressed_data) == data
+    assert reference_alz_decompress(compressed_data) == data
+
+
+def test_streaming_compress_rejects_optimal_level():
+    with pytest.raises(ValueError):
+        AlzCompressor("optimal")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 8, 17, 1000, None])
+@pytest.mark.parametrize("name", ["empty", "one_byte", "random", "text", "runs"])
+def test_streaming_decompress(chunk_size, name):
+    data = SAMPLES[name]
+    for compressed_data in [
+        alz_compress(data),  # stored as is when incompressible
+        stream_compress(data),
+        with_extended_header(stream_compress(data), len(data)),
+    ]:
+        size = chunk_size or max(1, len(compressed_data))
+        decompressor = AlzDecompressor()
+        result = bytearray()
+        for start in range(0, len(compressed_data), size):
+            result += decompressor.decompress(compressed_data[start : start + size])
+        result += decompressor.flush()
+        assert result == data
+
+
+@pytest.mark.parametrize("level", list(ALZ_LEVELS))
+def test_batch_matches_single_calls(level):
+    buffers = list(SAMPLES.values())
+
+    compressed = [bytes(data) for data in alz_compress_many(buffers, level)]
+    assert compressed == [alz_compress(data, level) for data in buffers]
+
+    decompressed = [bytes(data) for data in alz_decompress_many(compressed)]
+    assert decompressed == buffers
+
+    assert alz_compress_many([], level) == []
+    assert alz_decompress_many([]) == []
+
+
+@pytest.mark.parametrize("length", [1, 4, 16, 100])
+def test_decompress_heads_match_single_calls(length):
+    buffers = [alz_compress(data) for data in SAMPLES.values()]
+    # Separate the buffers with a gap, as in GAME.DAT
+    data = b"".join(buffer + b"\xff" * 5 for buffer in buffers)
+    ends = np.cumsum([len(buffer) + 5 for buffer in buffers]) - 5
+    starts = ends - [len(buffer) for buffer in buffers]
+
+    heads = np.zeros((len(buffers), length), dtype=np.uint8)
+    sizes = alz_decompress_heads_numba(
+        np.frombuffer(data, dtype=np.uint8), starts, ends, heads
+    )
+
+    for k, buffer in enumerate(buffers):
+        decompressed_data = alz_decompress(buffer)
+        assert sizes[k] == len(decompressed_data)
+        head_length = min(length, len(decompressed_data))
+        assert heads[k, :head_length].tobytes() == decompressed_data[:head_length]
+
+
+@pytest.mark.parametrize("name", ["zeros", "two_symbols", "text", "runs"])
+@pytest.mark.parametrize(
+    "header_size",
+    [
+        lambda size, payload: size,  # correct
+        lambda size, payload: 0,
+        lambda size, payload: size - 1,  # truncated
+        lambda size, payload: size + 1,
+        lambda size, payload: 9 * payload,  # the largest possible expansion
+        lambda size, payload: 9 * payload + 1,  # oversized
+        lambda size, payload: 0xFFFFFFFF,
+    ],
+    ids=["correct", "zero", "short", "long", "max", "oversized", "u32_max"],
+)
+def test_extended_header_size(name, header_size):
+    data = SAMPLES[name]
+    compressed_data = alz_compress(data)
+    assert compressed_data[:4] == b"ALZ\x31"
+    payload = len(compressed_data) - 4
+    size = header_size(len(data), payload)
+    extended_data = with_extended_header(compressed_data, size)
+
+    assert alz_decompress(extended_data) == data
+    assert bytes(alz_decompress_many([extended_data])[0]) == data
+    assert reference_alz_decompress(extended_data) == data
+
+    # The header is only trusted up to the largest possible expansion
+    expected_size = size if size <= 9 * payload else len(data)
+    assert alz_decompressed_size(extended_data) == expected_size
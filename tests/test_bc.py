@@ -0,0 +1,130 @@
+import random
+import struct
+
+import numpy as np
+import pytest
+from libs.bc import decode_bc1, decode_bc3
+from quicktex.s3tc.bc1 import BC1Decoder, BC1Texture
+from quicktex.s3tc.bc3 import BC3Decoder, BC3Texture
+
+
+def reference_decode_bc1(data: bytes, width: int, height: int) -> np.ndarray:
+    """The original quicktex-based BC1 decoder."""
+
+    texture = BC1Texture.from_bytes(data, width, height)
+    pixels = BC1Decoder(write_alpha=True).decode(texture).tobytes()
+    return np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4)
+
+
+def reference_decode_bc3(data: bytes, width: int, height: int) -> np.ndarray:
+    """The original quicktex-based BC3 decoder."""
+
+    texture = BC3Texture.from_bytes(data, width, height)
+    pixels = BC3Decoder().decode(texture).tobytes()
+    return np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4)
+
+
+def color_block(c0: int, c1: int, indices: list[int]) -> bytes:
+    """Build a BC1 color block from two RGB565 colors and 16 2-bit indices."""
+
+    packed = sum(index << (2 * k) for k, index in enumerate(indices))
+    return struct.pack("<HHI", c0, c1, packed)
+
+
+def alpha_block(a0: int, a1: int, indices: list[int]) -> bytes:
+    """Build a BC3 alpha block from two alphas and 16 3-bit indices."""
+
+    packed = sum(index << (3 * k) for k, index in enumerate(indices))
+    return bytes([a0, a1]) + packed.to_bytes(6, "little")
+
+
+ALL_COLOR_INDICES = [k % 4 for k in range(16)]
+ALL_ALPHA_INDICES = [k % 8 for k in range(16)]
+
+COLOR_BLOCKS = [
+    color_block(0xF800, 0x001F, ALL_COLOR_INDICES),  # c0 > c1: 4 colors
+    color_block(0x001F, 0xF800, ALL_COLOR_INDICES),  # c0 < c1: 3 colors, transparent
+    color_block(0x7BEF, 0x7BEF, ALL_COLOR_INDICES),  # c0 == c1: 3 colors too
+    color_block(0x0000, 0xFFFF, [3] * 16),  # fully transparent
+    color_block(0xFFFF, 0x0000, [3] * 16),
+    color_block(0x0000, 0x0000, [0] * 16),
+    color_block(0xFFFF, 0xFFFF, ALL_COLOR_INDICES[::-1]),
+    color_block(0x07E0, 0x0821, ALL_COLOR_INDICES),  # rounding of the middle colors
+]
+
+ALPHA_BLOCKS = [
+    alpha_block(255, 0, ALL_ALPHA_INDICES),  # a0 > a1: 8 alphas
+    alpha_block(0, 255, ALL_ALPHA_INDICES),  # a0 <= a1: 6 alphas, 0 and 255
+    alpha_block(128, 128, ALL_ALPHA_INDICES),
+    alpha_block(200, 13, ALL_ALPHA_INDICES[::-1]),
+    alpha_block(13, 200, ALL_ALPHA_INDICES[::-1]),
+    alpha_block(0, 0, [7] * 16),
+]
+
+# Sizes in pixels, including odd numbers of blocks and non-square textures
+SIZES = [(4, 4), (8, 4), (4, 8), (12, 20), (20, 12), (4, 36), (36, 4), (64, 64)]
+
+
+def random_blocks(rng: random.Random, blocks: list[bytes], count: int) -> bytes:
+    """Random blocks, mixed with the given special blocks."""
+
+    block_size = len(blocks[0])
+    return b"".join(
+        rng.choice(blocks) if rng.random() < 0.5 else rng.randbytes(block_size)
+        for _ in range(count)
+    )
+
+
+@pytest.mark.parametrize("width, height", SIZES)
+def test_decode_bc1_matches_quicktex(width, height):
+    rng = random.Random(width * 1000 + height)
+    data = random_blocks(rng, COLOR_BLOCKS, (width // 4) * (height // 4))
+
+    expected = reference_decode_bc1(data, width, height)
+    np.testing.assert_array_equal(decode_bc1(data, width, height), expected)
+
+
+@pytest.mark.parametrize("width, height", SIZES)
+def test_decode_bc3_matches_quicktex(width, height):
+    rng = random.Random(width * 1000 + height)
+    count = (width // 4) * (height // 4)
+    alpha_data = random_blocks(rng, ALPHA_BLOCKS, count)
+    color_data = random_blocks(rng, COLOR_BLOCKS, count)
+    data = b"".join(
+        alpha_data[i * 8 : i * 8 + 8] + color_data[i * 8 : i * 8 + 8]
+        for i in range(count)
+    )
+
+    expected = reference_decode_bc3(data, width, height)
+    np.testing.assert_array_equal(decode_bc3(data, width, height), expected)
+
+
+def test_decode_bc1_transparent_mode():
+    data = color_block(0x001F, 0xF800, [0, 1, 2, 3] * 4)
+    pixels = decode_bc1(data, 4, 4)
+
+    # Index 2 is the average of both colors, index 3 transparent black
+    assert pixels[0, 0].tolist() == [0, 0, 255, 255]
+    assert pixels[0, 1].tolist() == [255, 0, 0, 255]
+    assert pixels[0, 2].tolist() == [127, 0, 127, 255]
+    assert pixels[0, 3].tolist() == [0, 0, 0, 0]
+
+
+def test_decode_into_out():
+    data = b"".join(COLOR_BLOCKS[:4])
+    out = np.zeros((8, 8, 4), dtype=np.uint8)
+
+    assert decode_bc1(data, 8, 8, out) is out
+    np.testing.assert_array_equal(out, reference_decode_bc1(data, 8, 8))
+
+
+@pytest.mark.parametrize(
+    "decode, block_size", [(decode_bc1, 8), (decode_bc3, 16)], ids=["bc1", "bc3"]
+)
+def test_decode_rejects_invalid_sizes(decode, block_size):
+    with pytest.raises(ValueError):
+        decode(bytes(block_size * 4), 6, 8)
+    with pytest.raises(ValueError):
+        decode(bytes(block_size * 4), 8, 8 - 1)
+    with pytest.raises(ValueError):
+        decode(bytes(block_size * 4 - 1), 8, 8)
@@ -0,0 +1,52 @@
+import os
+
+from libs.cache import DiskCache
+
+
+def make_cache(tmp_path, max_size: int) -> DiskCache:
+    return DiskCache(str(tmp_path), max_size)
+
+
+def test_get_put(tmp_path):
+    cache = make_cache(tmp_path, 1000)
+    assert cache.get("abcd") is None
+    cache.put("abcd", b"data")
+    assert cache.get("abcd") == b"data"
+
+
+def test_get_survives_concurrent_eviction(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, 1000)
+    cache.put("abcd", b"data")
+
+    def evicted_utime(path, *args, **kwargs):
+        os.remove(path)
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, "utime", evicted_utime)
+    assert cache.get("abcd") == b"data"
+    assert cache.get("abcd") is None
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path, 250)
+    for i, key in enumerate(["aa00", "bb00", "cc00"]):
+        cache.put(key, bytes(100))
+        os.utime(cache._path(key), (i, i))
+
+    cache.evict()
+    assert cache.get("aa00") is None
+    assert cache.get("bb00") is not None
+    assert cache.get("cc00") is not None
+
+
+def test_evict_skips_files_being_written(tmp_path):
+    cache = make_cache(tmp_path, 0)
+    cache.put("aa00", bytes(100))
+    temp_path = f"{cache._path('bb00')}.1234.tmp"
+    os.makedirs(os.path.dirname(temp_path))
+    with open(temp_path, "wb") as f:
+        f.write(bytes(100))
+
+    cache.evict()
+    assert cache.get("aa00") is None
+    assert os.path.exists(temp_path)
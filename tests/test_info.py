@@ -0,0 +1,180 @@
+import fnmatch
+import random
+
+import pytest
+from libs.info import FileEntry, InfoDat
+
+
+def reference_decrypt_toc(data: bytes) -> bytes:
+    """The original per-byte implementation of `InfoDat.decrypt_toc`."""
+
+    if data[0] == 0 or len(data) <= 16:
+        return data
+
+    result = bytearray(data)
+    for offset in range(16, len(data), 16):
+        for i in range(16):
+            if offset + i >= len(data):
+                break
+            byte_val = result[offset + i]
+            swapped = ((byte_val >> 4) | (byte_val << 4)) & 0xFF
+            not_val = ~swapped & 0xFF
+            result[offset + i] = (not_val - data[i]) & 0xFF
+    return bytes(result)
+
+
+def reference_encrypt_toc(data: bytes) -> bytes:
+    """The original per-byte implementation of `InfoDat.encrypt_toc`."""
+
+    if data[0] == 0 or len(data) <= 16:
+        return data
+
+    header = data[:16]
+    result = bytearray(data)
+    for offset in range(16, len(data), 16):
+        for i in range(16):
+            pos = offset + i
+            if pos >= len(data):
+                break
+            tmp = (result[pos] + header[i]) & 0xFF
+            x = ~tmp & 0xFF
+            result[pos] = ((x >> 4) | (x << 4)) & 0xFF
+    return bytes(result)
+
+
+def reference_recalculate_offsets(entries: list[FileEntry]):
+    """The original per-entry implementation of `InfoDat.recalculate_offsets`."""
+
+    last_offset = 0
+    for entry in entries:
+        if entry.block_count == 0:
+            continue
+        entry.block_offset = last_offset
+        last_offset += entry.block_count
+
+
+def random_bytes(rng: random.Random, length: int) -> bytes:
+    return bytes(rng.getrandbits(8) for _ in range(length))
+
+
+def make_info_data(entries: list[FileEntry]) -> bytes:
+    """Build a plain INFO.DAT: a header entry holding the file count, then the table."""
+
+    header = FileEntry("TGM4 INFO", 0, 0, 0, len(entries)).to_unindexed_bytes()
+    return header + b"".join(entry.to_unindexed_bytes() for entry in entries)
+
+
+def random_entries(rng: random.Random, count: int) -> list[FileEntry]:
+    entries = []
+    for i in range(count):
+        size = rng.choice([0, 0, 1, 2047, 2048, 2049, rng.randrange(1, 1 << 20)])
+        block_count = (size + 2047) // 2048
+        entries.append(
+            FileEntry(
+                f"dir/file{i:04}.bin", size, block_count, rng.randrange(1 << 20), 0
+            )
+        )
+    return entries
+
+
+@pytest.mark.parametrize(
+    "length", [1, 2, 15, 16, 17, 31, 32, 33, 47, 48, 100, 4096, 4097]
+)
+def test_toc_cipher_matches_reference(length):
+    rng = random.Random(length)
+    for _ in range(8):
+        data = random_bytes(rng, length)
+        assert InfoDat.decrypt_toc(data) == reference_decrypt_toc(data)
+        assert InfoDat.encrypt_toc(data) == reference_encrypt_toc(data)
+
+
+@pytest.mark.parametrize("length", [17, 31, 48, 100, 4097])
+def test_toc_cipher_round_trip(length):
+    data = b"\x01" + random_bytes(random.Random(length), length - 1)
+    assert InfoDat.decrypt_toc(InfoDat.encrypt_toc(data)) == data
+    assert InfoDat.encrypt_toc(InfoDat.decrypt_toc(data)) == data
+
+
+@pytest.mark.parametrize("length", [1, 16, 17, 100])
+def test_toc_cipher_passes_through_unencrypted_data(length):
+    data = b"\x00" + random_bytes(random.Random(length), length - 1)
+    assert InfoDat.decrypt_toc(data) == data
+    assert InfoDat.encrypt_toc(data) == data
+
+    short_data = b"\x01" + random_bytes(random.Random(length), min(length, 16) - 1)
+    assert InfoDat.decrypt_toc(short_data) == short_data
+    assert InfoDat.encrypt_toc(short_data) == short_data
+
+
+@pytest.mark.parametrize("count", [0, 1, 7, 300])
+def test_parse_serialize_round_trip(count):
+    plain_data = make_info_data(random_entries(random.Random(count), count))
+
+    info_dat = InfoDat.from_plain_bytes(plain_data)
+    assert info_dat.file_count == count
+    assert info_dat.to_plain_bytes() == plain_data
+
+    encrypted_data = reference_encrypt_toc(plain_data)
+    info_dat = InfoDat.from_encrypted_bytes(encrypted_data)
+    assert info_dat.to_encrypted_bytes() == encrypted_data
+
+
+def test_parse_serialize_keeps_entry_changes():
+    entries = random_entries(random.Random(1), 20)
+    info_dat = InfoDat.from_plain_bytes(make_info_data(entries))
+
+    entry = info_dat.entry(3)
+    entry.update_size(5000)
+    entries[3].size = 5000
+    entries[3].block_count = 3
+    entries[3].block_offset = 0
+    assert info_dat.to_plain_bytes() == make_info_data(entries)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_recalculate_offsets_matches_reference(seed):
+    rng = random.Random(seed)
+    entries = random_entries(rng, 200)
+    # Runs of empty entries at the start, in the middle and at the end
+    for i in [0, 1, 50, 51, 52, 198, 199]:
+        entries[i].size = 0
+        entries[i].block_count = 0
+
+    info_dat = InfoDat.from_plain_bytes(make_info_data(entries))
+    # Materialized and modified entries must be taken into account too
+    info_dat.entry(10).update_size(10000)
+    entries[10].size = 10000
+    entries[10].block_count = 5
+    info_dat.entry(50).update_size(0)
+    entries[50].block_offset = 0
+
+    info_dat.recalculate_offsets()
+    reference_recalculate_offsets(entries)
+
+    assert info_dat.to_plain_bytes() == make_info_data(entries)
+    assert [entry.block_offset for entry in info_dat.entries] == [
+        entry.block_offset for entry in entries
+    ]
+    # Empty entries keep their original offset
+    assert info_dat.entry(0).block_offset == entries[0].block_offset
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [None, "*", "dir/*", "dir/file00*", "dir/file0?1?.bin", "*[13].bin", "nope/*"],
+)
+def test_glob_indices_match_entries(pattern):
+    entries = random_entries(random.Random(2), 50)
+    rng = random.Random(3)
+    rng.shuffle(entries)
+    info_dat = InfoDat.from_plain_bytes(make_info_data(entries))
+
+    assert info_dat.names == [entry.name for entry in entries]
+    indices = info_dat.glob_indices(pattern)
+    if pattern is None:
+        assert indices == list(range(len(entries)))
+    else:
+        assert [info_dat.entry(i) for i in indices] == info_dat.glob(pattern)
+        assert [entries[i].name for i in indices] == sorted(
+            entry.name for entry in entries if fnmatch.fnmatchcase(entry.name, pattern)
+        )
@@ -0,0 +1,147 @@
+import pytest
+from libs.tws import (
+    BLOCK_SIZES,
+    FORMAT_BC1,
+    FORMAT_BC3,
+    FORMAT_BC3_LIKE,
+    FORMAT_BGR,
+    FORMAT_RGBA,
+    MIPMAP_FORMATS,
+    PIXEL_SIZES,
+    TwsFile,
+    mip_layout,
+)
+
+FORMATS = [FORMAT_BGR, FORMAT_RGBA, FORMAT_BC1, FORMAT_BC3_LIKE, FORMAT_BC3]
+
+# Including non-square textures, and levels down to less than a block
+SIZES = [
+    (1, 1),
+    (2, 2),
+    (4, 4),
+    (8, 4),
+    (4, 8),
+    (1, 8),
+    (16, 2),
+    (12, 20),
+    (64, 256),
+    (256, 64),
+    (512, 512),
+    (1024, 8),
+]
+
+
+def reference_level_size(width: int, height: int, level: int) -> tuple[int, int]:
+    """The original `TwsFile.level_size`."""
+
+    return max(1, width >> level), max(1, height >> level)
+
+
+def reference_level_range(
+    width: int, height: int, data_format: int, level: int
+) -> tuple[int, int]:
+    """The original `TwsFile.level_data` arithmetic, for any format."""
+
+    def level_bytes(level):
+        level_width, level_height = reference_level_size(width, height, level)
+        if data_format in BLOCK_SIZES:
+            return (level_width // 4) * (level_height // 4) * BLOCK_SIZES[data_format]
+        return level_width * level_height * PIXEL_SIZES[data_format]
+
+    offset = sum(level_bytes(i) for i in range(level))
+    return offset, level_bytes(level)
+
+
+def reference_check_size(
+    image_data_size: int, width: int, height: int, data_format: int
+) -> int:
+    """
+    The original `TwsFile.check_size`.
+
+    The mipmap loop is bounded, as the original never ended for sizes larger
+    than the full mipmap chain.
+    """
+
+    if data_format in PIXEL_SIZES:
+        expected_size = width * height * PIXEL_SIZES[data_format]
+    elif data_format == FORMAT_BC1:
+        expected_size = (width // 4) * (height // 4) * 8
+    else:
+        mipmap_level = 0
+        mipmap_width = width
+        mipmap_height = height
+        expected_size = (mipmap_width // 4) * (mipmap_height // 4) * 16
+        while image_data_size >= expected_size and mipmap_level < 64:
+            if image_data_size == expected_size:
+                break
+            mipmap_level += 1
+            mipmap_width = max(1, mipmap_width // 2)
+            mipmap_height = max(1, mipmap_height // 2)
+            expected_size += (mipmap_width // 4) * (mipmap_height // 4) * 16
+        if image_data_size != expected_size:
+            raise ValueError("Invalid image data size")
+        return mipmap_level
+
+    if image_data_size != expected_size:
+        raise ValueError("Invalid image data size")
+    return 0
+
+
+@pytest.mark.parametrize("width, height", SIZES)
+@pytest.mark.parametrize("data_format", FORMATS)
+def test_mip_layout_matches_reference(data_format, width, height):
+    layout = mip_layout(width, height, data_format)
+
+    if data_format in MIPMAP_FORMATS:
+        # Down to 1x1
+        assert layout.level_count == max(width, height).bit_length()
+        assert layout.level_sizes[-1] == (1, 1)
+    else:
+        assert layout.level_count == 1
+
+    for level in range(layout.level_count):
+        assert layout.level_sizes[level] == reference_level_size(width, height, level)
+        assert layout.level_range(level) == reference_level_range(
+            width, height, data_format, level
+        )
+        offset, size = layout.level_range(level)
+        assert layout.data_size(level + 1) == offset + size
+    assert layout.data_size(0) == 0
+
+
+@pytest.mark.parametrize("width, height", SIZES)
+@pytest.mark.parametrize("data_format", FORMATS)
+def test_check_size_matches_reference(data_format, width, height):
+    layout = mip_layout(width, height, data_format)
+    total_size = layout.data_size(layout.level_count)
+
+    # Every level count, and the sizes in between
+    sizes = sorted(
+        {
+            size + delta
+            for size in layout.offsets[1:]
+            for delta in (-1, 0, 1)
+            if 0 <= size + delta <= total_size
+        }
+    )
+    for size in sizes:
+        try:
+            expected = reference_check_size(size, width, height, data_format)
+        except ValueError:
+            with pytest.raises(ValueError):
+                TwsFile.check_size(size, width, height, data_format)
+        else:
+            assert TwsFile.check_size(size, width, height, data_format) == expected
+
+    with pytest.raises(ValueError):
+        TwsFile.check_size(total_size + 1, width, height, data_format)
+
+
+def test_mip_layout_is_shared():
+    assert mip_layout(64, 32, FORMAT_BC3) is mip_layout(64, 32, FORMAT_BC3)
+    assert mip_layout(64, 32, FORMAT_BC3) is not mip_layout(32, 64, FORMAT_BC3)
+
+
+def test_mip_layout_rejects_unsupported_formats():
+    with pytest.raises(ValueError):
+        mip_layout(4, 4, 0)